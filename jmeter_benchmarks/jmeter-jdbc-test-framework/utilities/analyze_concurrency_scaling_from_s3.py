@@ -23,7 +23,7 @@ import tempfile
 from jmeter_s3_utils import (
     JMeterS3Path,
     list_s3_files,
-    download_jmeter_statistics,
+    download_statistics_bulk,
     load_jmeter_statistics,
     extract_query_metrics,
     get_timestamp,
@@ -343,11 +343,12 @@ def main():
     
     with tempfile.TemporaryDirectory() as tmpdir:
         tmpdir_path = Path(tmpdir)
+        stats_files = download_statistics_bulk([path for _, path in concurrency_runs], tmpdir_path)
         
         for conc, path in concurrency_runs:
             print(f"\nLoading concurrency={conc}...")
             
-            stats_file = download_jmeter_statistics(path, tmpdir_path / f'c{conc}')
+            stats_file = stats_files.get(path)
             
             if not stats_file:
                 print(f"  ⚠️  Skipping C={conc} (no statistics file found)")
@@ -22,7 +22,7 @@ from typing import Dict, List, Tuple, Optional
 
 # Add utilities to path for imports
 sys.path.insert(0, str(Path(__file__).parent))
-from jmeter_s3_utils import list_s3_files, load_statistics_from_s3, normalize_query_name, extract_query_metrics
+from jmeter_s3_utils import list_s3_files, load_many_statistics, normalize_query_name, extract_query_metrics
 
 
 def find_two_latest_runs(s3_path: str, base_s3_bucket: str, concurrency: int,
@@ -559,8 +559,7 @@ This will find all concurrency levels and compare the specified runs (or two mos
 
         # Load statistics
         print(f"📥 Loading statistics...")
-        previous_stats = load_statistics_from_s3(previous_file)
-        latest_stats = load_statistics_from_s3(latest_file)
+        previous_stats, latest_stats = load_many_statistics([previous_file, latest_file])
 
         if not previous_stats or not latest_stats:
             print(f"⚠️  Failed to load statistics for C={concurrency}")
@@ -26,10 +26,14 @@ from jmeter_s3_utils import (
     extract_query_metrics,
     create_query_mapping,
     calculate_percentage_diff,
+    calculate_percentage_diffs,
     format_percentage,
     get_timestamp,
 )
 
+# Metric keys in CSV column order
+_METRIC_KEYS = ('avg', 'median', 'p90', 'p95', 'p99', 'min', 'max')
+
 
 def generate_comparison_csv(
     engine1_name: str,
@@ -71,16 +75,17 @@ def generate_comparison_csv(
         ]
         writer.writerow(header)
 
-        # Query data
+        # Extract metrics once and keep only queries present in both runs
+        valid = []
         for query_name in sorted(query_mapping.keys()):
             q1_name, q2_name = query_mapping[query_name]
-
             m1 = extract_query_metrics(stats1, q1_name)
             m2 = extract_query_metrics(stats2, q2_name)
+            if m1 and m2:
+                valid.append((query_name, m1, m2))
 
-            if not m1 or not m2:
-                continue
-
+        # Query data
+        for query_name, m1, m2 in valid:
             row = [query_name]
 
             # Engine 1 metrics
@@ -106,9 +111,8 @@ def generate_comparison_csv(
             ])
 
             # Differences (positive = engine1 faster)
-            for metric in ['avg', 'median', 'p90', 'p95', 'p99', 'min', 'max']:
-                diff = calculate_percentage_diff(m1[metric], m2[metric])
-                row.append(f"{diff:.1f}")
+            diffs = calculate_percentage_diffs([m1[m] for m in _METRIC_KEYS], [m2[m] for m in _METRIC_KEYS])
+            row.extend(f"{diff:.1f}" for diff in diffs)
 
             writer.writerow(row)
 
@@ -116,19 +120,19 @@ def generate_comparison_csv(
         writer.writerow([])
         writer.writerow(['SUMMARY STATISTICS'])
 
-        for stat_label in ['Average', 'Median', 'p90', 'p95', 'p99']:
-            metric_key = stat_label.lower()
+        # Map stat labels to metric keys
+        stat_metrics = {
+            'Average': 'avg',
+            'Median': 'median',
+            'p90': 'p90',
+            'p95': 'p95',
+            'p99': 'p99'
+        }
 
+        for stat_label, metric_key in stat_metrics.items():
             # Collect values
-            vals1 = []
-            vals2 = []
-            for query_name in query_mapping.keys():
-                q1_name, q2_name = query_mapping[query_name]
-                m1 = extract_query_metrics(stats1, q1_name)
-                m2 = extract_query_metrics(stats2, q2_name)
-                if m1 and m2:
-                    vals1.append(m1[metric_key])
-                    vals2.append(m2[metric_key])
+            vals1 = [m1[metric_key] for _, m1, _ in valid]
+            vals2 = [m2[metric_key] for _, _, m2 in valid]
 
             if vals1 and vals2:
                 avg1 = sum(vals1) / len(vals1)
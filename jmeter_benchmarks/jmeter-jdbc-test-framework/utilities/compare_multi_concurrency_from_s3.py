@@ -19,21 +19,60 @@ import csv
 import argparse
 import re
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 import tempfile
 
 from jmeter_s3_utils import (
     JMeterS3Path,
     list_s3_files,
-    download_jmeter_statistics,
+    download_statistics_bulk,
     load_jmeter_statistics,
     extract_query_metrics,
     create_query_mapping,
     calculate_percentage_diff,
+    calculate_percentage_diffs,
     format_percentage,
     get_timestamp,
 )
 
+# Metric keys in CSV column order
+_METRIC_KEYS = ('avg', 'median', 'p90', 'p95', 'p99', 'min', 'max')
+
+# Pre-built format for one concurrency block: 7 + 7 latencies (s), 7 diffs (%)
+_BLOCK_FORMAT = ','.join(['%.2f'] * 14 + ['%.1f'] * 7)
+_EMPTY_BLOCK = ',' * 20
+
+
+def _csv_cell(value: str) -> str:
+    """Quote a single CSV cell the way csv.writer would."""
+    if any(c in value for c in ',"\r\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def _paired_means(stats1: Dict, stats2: Dict, mapping: Dict) -> Optional[Dict[str, Tuple[float, float]]]:
+    """
+    Average each metric over the queries that have metrics in both runs.
+
+    Returns dict: metric -> (engine1_mean, engine2_mean), or None if no query
+    has metrics in both runs.
+    """
+    sums1 = dict.fromkeys(_METRIC_KEYS, 0.0)
+    sums2 = dict.fromkeys(_METRIC_KEYS, 0.0)
+    count = 0
+    for q1_name, q2_name in mapping.values():
+        m1 = extract_query_metrics(stats1, q1_name)
+        m2 = extract_query_metrics(stats2, q2_name)
+        if m1 and m2:
+            count += 1
+            for metric in _METRIC_KEYS:
+                sums1[metric] += m1[metric]
+                sums2[metric] += m2[metric]
+
+    if not count:
+        return None
+    return {metric: (sums1[metric] / count, sums2[metric] / count) for metric in _METRIC_KEYS}
+
 
 def find_concurrency_runs(base_s3_path: str) -> List[Tuple[int, str]]:
     """Find all concurrency run directories under a base path."""
@@ -116,56 +155,35 @@ def generate_multi_concurrency_csv(
         writer.writerow(header)
         
         # Query data
+        _extract = extract_query_metrics
+        _pct = calculate_percentage_diff
+        per_conc = [concurrency_data[conc] for conc in concurrency_levels]
+        
         for query in all_queries:
-            row = [query]
+            blocks = []
             
-            for conc in concurrency_levels:
-                if conc not in concurrency_data:
-                    row.extend([''] * 21)
-                    continue
-                
-                stats1, stats2, mapping = concurrency_data[conc]
-                
+            for stats1, stats2, mapping in per_conc:
                 if query not in mapping:
-                    row.extend([''] * 21)
+                    blocks.append(_EMPTY_BLOCK)
                     continue
                 
                 q1_name, q2_name = mapping[query]
-                m1 = extract_query_metrics(stats1, q1_name)
-                m2 = extract_query_metrics(stats2, q2_name)
+                m1 = _extract(stats1, q1_name)
+                m2 = _extract(stats2, q2_name)
                 
                 if not m1 or not m2:
-                    row.extend([''] * 21)
+                    blocks.append(_EMPTY_BLOCK)
                     continue
                 
-                # Engine 1 metrics
-                row.extend([
-                    f"{m1['avg']:.2f}",
-                    f"{m1['median']:.2f}",
-                    f"{m1['p90']:.2f}",
-                    f"{m1['p95']:.2f}",
-                    f"{m1['p99']:.2f}",
-                    f"{m1['min']:.2f}",
-                    f"{m1['max']:.2f}",
-                ])
-                
-                # Engine 2 metrics
-                row.extend([
-                    f"{m2['avg']:.2f}",
-                    f"{m2['median']:.2f}",
-                    f"{m2['p90']:.2f}",
-                    f"{m2['p95']:.2f}",
-                    f"{m2['p99']:.2f}",
-                    f"{m2['min']:.2f}",
-                    f"{m2['max']:.2f}",
-                ])
-                
-                # Differences
-                for metric in ['avg', 'median', 'p90', 'p95', 'p99', 'min', 'max']:
-                    diff = calculate_percentage_diff(m1[metric], m2[metric])
-                    row.append(f"{diff:.1f}")
+                # Engine 1 metrics, engine 2 metrics, differences
+                values1 = [m1[metric] for metric in _METRIC_KEYS]
+                values2 = [m2[metric] for metric in _METRIC_KEYS]
+                values = values1 + values2 + calculate_percentage_diffs(values1, values2)
+                blocks.append(_BLOCK_FORMAT % tuple(values))
             
-            writer.writerow(row)
+            # Numeric cells never need quoting, so write the line directly;
+            # the query name goes through csv.writer's quoting rules.
+            f.write(f"{_csv_cell(query)},{','.join(blocks)}{writer.dialect.lineterminator}")
         
         # Summary statistics
         writer.writerow([])
@@ -180,42 +198,27 @@ def generate_multi_concurrency_csv(
             'p99': 'p99'
         }
 
+        per_conc_means = [_paired_means(*data) for data in per_conc]
+        
         for stat_label, metric_key in stat_metrics.items():
             row = [stat_label]
             
-            for conc in concurrency_levels:
-                if conc not in concurrency_data:
+            for means in per_conc_means:
+                if means is None:
                     row.extend([''] * 21)
                     continue
                 
-                stats1, stats2, mapping = concurrency_data[conc]
-                
-                # Collect values
-                vals1 = []
-                vals2 = []
-                for query in mapping.keys():
-                    q1_name, q2_name = mapping[query]
-                    m1 = extract_query_metrics(stats1, q1_name)
-                    m2 = extract_query_metrics(stats2, q2_name)
-                    if m1 and m2:
-                        vals1.append(m1[metric_key])
-                        vals2.append(m2[metric_key])
+                avg1, avg2 = means[metric_key]
+                diff = _pct(avg1, avg2)
                 
-                if vals1 and vals2:
-                    avg1 = sum(vals1) / len(vals1)
-                    avg2 = sum(vals2) / len(vals2)
-                    diff = calculate_percentage_diff(avg1, avg2)
-                    
-                    row.extend([
-                        f"{avg1:.2f}",
-                        '', '', '', '', '', '',  # Placeholders
-                        f"{avg2:.2f}",
-                        '', '', '', '', '', '',  # Placeholders
-                        f"{diff:.1f}",
-                        '', '', '', '', '', ''   # Placeholders
-                    ])
-                else:
-                    row.extend([''] * 21)
+                row.extend([
+                    f"{avg1:.2f}",
+                    '', '', '', '', '', '',  # Placeholders
+                    f"{avg2:.2f}",
+                    '', '', '', '', '', '',  # Placeholders
+                    f"{diff:.1f}",
+                    '', '', '', '', '', ''   # Placeholders
+                ])
             
             writer.writerow(row)
 
@@ -246,34 +249,22 @@ def generate_multi_concurrency_summary(
         # Performance by concurrency
         f.write(f"## Performance by Concurrency Level\n\n")
         
+        per_conc_means = {conc: _paired_means(*concurrency_data[conc]) for conc in concurrency_levels}
+        
         for conc in concurrency_levels:
-            stats1, stats2, mapping = concurrency_data[conc]
+            means = per_conc_means[conc]
             
-            # Calculate summary metrics
-            vals1_avg = []
-            vals2_avg = []
-            vals1_p99 = []
-            vals2_p99 = []
-            
-            for query in mapping.keys():
-                q1_name, q2_name = mapping[query]
-                m1 = extract_query_metrics(stats1, q1_name)
-                m2 = extract_query_metrics(stats2, q2_name)
-                if m1 and m2:
-                    vals1_avg.append(m1['avg'])
-                    vals2_avg.append(m2['avg'])
-                    vals1_p99.append(m1['p99'])
-                    vals2_p99.append(m2['p99'])
+            f.write(f"### Concurrency = {conc}\n\n")
+            if means is None:
+                f.write(f"No queries with metrics in both runs.\n\n")
+                continue
             
-            avg1 = sum(vals1_avg) / len(vals1_avg)
-            avg2 = sum(vals2_avg) / len(vals2_avg)
-            p99_1 = sum(vals1_p99) / len(vals1_p99)
-            p99_2 = sum(vals2_p99) / len(vals2_p99)
+            avg1, avg2 = means['avg']
+            p99_1, p99_2 = means['p99']
             
             avg_diff = calculate_percentage_diff(avg1, avg2)
             p99_diff = calculate_percentage_diff(p99_1, p99_2)
             
-            f.write(f"### Concurrency = {conc}\n\n")
             f.write(f"| Metric | {engine1_name.upper()} | {engine2_name.upper()} | Difference |\n")
             f.write(f"|--------|----------|-----------|------------|\n")
             
@@ -292,20 +283,11 @@ def generate_multi_concurrency_summary(
         total_wins_engine1 = 0
         total_wins_engine2 = 0
         
-        for conc in concurrency_levels:
-            stats1, stats2, mapping = concurrency_data[conc]
-            vals1 = []
-            vals2 = []
-            for query in mapping.keys():
-                q1_name, q2_name = mapping[query]
-                m1 = extract_query_metrics(stats1, q1_name)
-                m2 = extract_query_metrics(stats2, q2_name)
-                if m1 and m2:
-                    vals1.append(m1['avg'])
-                    vals2.append(m2['avg'])
+        for means in per_conc_means.values():
+            if means is None:
+                continue
             
-            avg1 = sum(vals1) / len(vals1)
-            avg2 = sum(vals2) / len(vals2)
+            avg1, avg2 = means['avg']
             
             if avg1 < avg2:
                 total_wins_engine1 += 1
@@ -365,6 +347,13 @@ def main():
     with tempfile.TemporaryDirectory() as tmpdir:
         tmpdir_path = Path(tmpdir)
         
+        # Download statistics for all concurrency levels up front (one listing per engine)
+        print("\nDownloading statistics from S3...")
+        stats_files1 = download_statistics_bulk(
+            [engine1_map[conc] for conc in common_concurrencies], tmpdir_path / 'e1')
+        stats_files2 = download_statistics_bulk(
+            [engine2_map[conc] for conc in common_concurrencies], tmpdir_path / 'e2')
+        
         for conc in sorted(common_concurrencies):
             print(f"\nProcessing concurrency={conc}...")
             
@@ -375,9 +364,8 @@ def main():
             parsed1 = JMeterS3Path(path1)
             parsed2 = JMeterS3Path(path2)
             
-            # Download statistics
-            stats_file1 = download_jmeter_statistics(path1, tmpdir_path / f'c{conc}_e1')
-            stats_file2 = download_jmeter_statistics(path2, tmpdir_path / f'c{conc}_e2')
+            stats_file1 = stats_files1.get(path1)
+            stats_file2 = stats_files2.get(path2)
             
             if not stats_file1 or not stats_file2:
                 print(f"  ⚠️  Skipping C={conc} (missing statistics files)")
@@ -24,46 +24,104 @@ Example:
 import csv
 import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from itertools import islice
 
 # Reserved SQL keywords that need quoting in e6data
 KEYWORDS = ['year', 'week', 'month', 'quarter', 'period', 'date', 'format', 'variant']
 
+# Accepted names (case-insensitive) for the column holding the SQL text
+QUERY_COLUMNS = {'QUERY', 'SQL', 'STATEMENT'}
+
+# Buffer size for CSV input/output (query files can be many MB)
+IO_BUFFER_SIZE = 1 << 20
+
+# Rows read per batch and rows per worker task when converting in parallel
+BATCH_SIZE = 4096
+CHUNK_SIZE = 256
+
+# Pre-compiled patterns used by convert_query
+CTE_WITH_PATTERN = re.compile(r'\bwith\s+(\w+)\s*\(', re.IGNORECASE)
+CTE_COMMA_PATTERN = re.compile(r',\s*(\w+)\s*\((?=\s*select)', re.IGNORECASE)
+GLOBAL_SCHEMA_PATTERN = re.compile(r'\.global\.', re.IGNORECASE)
+DEFAULT_SCHEMA_PATTERN = re.compile(r'\.default\.', re.IGNORECASE)
+CONCAT_PATTERN = re.compile(r'\bconcat\s*\(', re.IGNORECASE)
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# All keywords in one alternation so each pattern scans the query once, not once per keyword
+KEYWORD_ALTERNATION = '|'.join(KEYWORDS)
+KEYWORD_DOT_PATTERN = re.compile(r'\.(' + KEYWORD_ALTERNATION + r')\b(?!\()', re.IGNORECASE)
+KEYWORD_SELECT_PATTERN = re.compile(r'(?<=select\s)(' + KEYWORD_ALTERNATION + r')\b', re.IGNORECASE)
+KEYWORD_MID_PATTERN = re.compile(r'(?<=,\s)(' + KEYWORD_ALTERNATION + r')(?=\s*,)', re.IGNORECASE)
+KEYWORD_BEFORE_FROM_PATTERN = re.compile(r'(?<=,\s)(' + KEYWORD_ALTERNATION + r')(?=\s+from\b)', re.IGNORECASE)
+
+def strip_hints(query):
+    """Remove /*+ ... */ optimizer hints; hint bodies may contain '*'."""
+    parts = []
+    pos = 0
+    while True:
+        start = query.find('/*+', pos)
+        if start < 0:
+            break
+        end = query.find('*/', start + 3)
+        if end < 0:
+            break
+        parts.append(query[pos:start])
+        pos = end + 2
+    parts.append(query[pos:])
+    return ''.join(parts)
+
 def convert_query(query, remove_hints=False):
     """Convert multiline query to single-line with JSON/e6data fixes."""
 
-    # 1. Collapse multiline to single line
-    query = ' '.join(query.split())
+    # 1. Collapse multiline to single line (skipped when already single-spaced:
+    #    isprintable() is False for every whitespace character except ' ')
+    if not (query.isprintable() and '  ' not in query
+            and not query.startswith(' ') and not query.endswith(' ')):
+        query = WHITESPACE_PATTERN.sub(' ', query).strip()
+
+    # Cheap literal checks below skip regex passes that cannot match. Lower-casing
+    # mirrors re.IGNORECASE exactly only for ASCII, so other text takes every pass.
+    lowered = query.lower()
+    scan_all = not query.isascii()
 
     # 2. Fix CTE syntax: with name( → with name as (
-    query = re.sub(r'\bwith\s+(\w+)\s*\(', r'with \1 as (', query, flags=re.IGNORECASE)
+    if scan_all or 'with' in lowered:
+        query = CTE_WITH_PATTERN.sub(r'with \1 as (', query)
 
     # 3. Fix CTE syntax: , name( → , name as (
-    query = re.sub(r',\s*(\w+)\s*\((?=\s*select)', r', \1 as (', query, flags=re.IGNORECASE)
+    if scan_all or 'select' in lowered:
+        query = CTE_COMMA_PATTERN.sub(r', \1 as (', query)
 
     # 4. Replace backticks with double quotes
     query = query.replace('`', '"')
 
     # 5. Quote schema names
-    query = re.sub(r'\.global\.', '."global".', query, flags=re.IGNORECASE)
-    query = re.sub(r'\.default\.', '."default".', query, flags=re.IGNORECASE)
+    if scan_all or '.global.' in lowered:
+        query = GLOBAL_SCHEMA_PATTERN.sub('."global".', query)
+    if scan_all or '.default.' in lowered:
+        query = DEFAULT_SCHEMA_PATTERN.sub('."default".', query)
 
     # 6. Quote reserved keywords as column names
-    for keyword in KEYWORDS:
+    if scan_all or any(keyword in lowered for keyword in KEYWORDS):
         # Pattern: .keyword → ."keyword"
-        query = re.sub(r'\.(' + keyword + r')\b(?!\()', r'."\1"', query, flags=re.IGNORECASE)
+        query = KEYWORD_DOT_PATTERN.sub(r'."\1"', query)
 
         # Pattern: select keyword, → select "keyword",
-        query = re.sub(r'(?<=select\s)(' + keyword + r')\b', r'"\1"', query, flags=re.IGNORECASE)
-        query = re.sub(r'(?<=,\s)(' + keyword + r')(?=\s*,)', r'"\1"', query, flags=re.IGNORECASE)
-        query = re.sub(r'(?<=,\s)(' + keyword + r')(?=\s+from\b)', r'"\1"', query, flags=re.IGNORECASE)
+        query = KEYWORD_SELECT_PATTERN.sub(r'"\1"', query)
+        query = KEYWORD_MID_PATTERN.sub(r'"\1"', query)
+        query = KEYWORD_BEFORE_FROM_PATTERN.sub(r'"\1"', query)
 
     # 7. Fix concat → Concat
-    query = re.sub(r'\bconcat\s*\(', 'Concat(', query, flags=re.IGNORECASE)
+    if scan_all or 'concat' in lowered:
+        query = CONCAT_PATTERN.sub('Concat(', query)
 
     # 8. Remove optimizer hints (optional)
-    if remove_hints:
-        query = re.sub(r'/\*\+[^*]*\*/', '', query)
-        query = re.sub(r'\s+', ' ', query)
+    if remove_hints and '/*+' in query:
+        query = strip_hints(query)
+        query = WHITESPACE_PATTERN.sub(' ', query)
         query = query.strip()
 
     # 9. Escape double quotes for JSON compatibility
@@ -90,44 +148,51 @@ def main():
         print("Removing optimizer hints: Yes")
     print()
 
-    # Read input
-    queries = []
-    with open(input_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        fieldnames = reader.fieldnames
-
-        for row in reader:
-            queries.append(row)
-
-    print(f"Loaded {len(queries)} queries")
-    print()
+    # Convert and write each row as it is read
+    count = 0
+    with open(input_file, 'r', encoding='utf-8', newline='', buffering=IO_BUFFER_SIZE) as fin:
+        reader = csv.DictReader(fin)
+        fieldnames = reader.fieldnames or []
 
-    # Process each query
-    for i, row in enumerate(queries, 1):
         # Find query column (QUERY, Query, query, SQL, etc.)
-        query_col = None
-        for col in row.keys():
-            if col.upper() in ['QUERY', 'SQL', 'STATEMENT']:
-                query_col = col
-                break
-
+        query_col = next((col for col in fieldnames if col.upper() in QUERY_COLUMNS), None)
         if not query_col:
-            print(f"⚠️  Row {i}: Could not find query column, skipping")
-            continue
-
-        original = row[query_col]
-        converted = convert_query(original, remove_hints)
-        row[query_col] = converted
-
-        print(f"✓ Query {i}: {len(original):,} → {len(converted):,} chars")
-
-    # Write output
-    with open(output_file, 'w', encoding='utf-8', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in queries:
-            writer.writerow(row)
+            print(f"❌ Could not find query column in {input_file} (columns: {', '.join(fieldnames)})")
+            sys.exit(1)
+
+        # convert_query is pure and CPU-bound, so spread batches of rows across processes.
+        # Inputs smaller than one batch (the common case) are converted inline instead:
+        # starting the worker processes would cost more than the conversion itself.
+        # Benchmark files often repeat the same query text, so each distinct query in a batch is
+        # converted once (per batch, so memory stays bounded by BATCH_SIZE)
+        convert = partial(convert_query, remove_hints=remove_hints)
+        batch = list(islice(reader, BATCH_SIZE))
+        parallel = len(batch) == BATCH_SIZE
+        with open(output_file, 'w', encoding='utf-8', newline='', buffering=IO_BUFFER_SIZE) as fout, \
+                (ProcessPoolExecutor() if parallel else nullcontext()) as executor:
+            writer = csv.DictWriter(fout, fieldnames=fieldnames)
+            writer.writeheader()
+
+            while batch:
+                originals = [row[query_col] for row in batch]
+                distinct = list(dict.fromkeys(originals))
+                if parallel:
+                    converted_queries = executor.map(convert, distinct, chunksize=CHUNK_SIZE)
+                else:
+                    converted_queries = map(convert, distinct)
+                converted_by_query = dict(zip(distinct, converted_queries))
+                for row, original in zip(batch, originals):
+                    converted = converted_by_query[original]
+                    count += 1
+                    row[query_col] = converted
+
+                    print(f"✓ Query {count}: {len(original):,} → {len(converted):,} chars")
+
+                writer.writerows(batch)
+                batch = list(islice(reader, BATCH_SIZE))
 
+    print()
+    print(f"Converted {count} queries")
     print()
     print(f"✅ Conversion complete! Output: {output_file}")
     print()
@@ -38,8 +38,10 @@ import os
 import csv
 import json
 import re
+import time
 import argparse
 from datetime import datetime, timedelta
+from itertools import chain
 from urllib.parse import urlparse, parse_qs
 
 try:
@@ -48,28 +50,49 @@ except ImportError:
     print("Error: requests module not found. Install with: pip install requests")
     sys.exit(1)
 
+# Properties line: optional indent, key (not starting with #), '=', value
+PROPERTY_LINE_PATTERN = re.compile(r'^[^\S\n]*([^#\s=][^=\n]*?|)[^\S\n]*=(.*)$', re.MULTILINE)
+# Metadata files are bash variable assignments
+METADATA_VAR_PATTERN = re.compile(r'^(\w+)=(.+)$', re.MULTILINE)
+CLUSTER_CONFIG_PATTERN = re.compile(r'CLUSTER_CONFIG=\'({[^}]+})\'', re.DOTALL)
+WAREHOUSE_ID_PATTERN = re.compile(r'/warehouses/([a-f0-9]+)')
+JDBC_HOST_PATTERN = re.compile(r'jdbc:dbr://([^:]+)')
 
-def parse_connection_properties(properties_file):
-    """Parse DBR connection properties file."""
-    props = {}
+# Page size requested from the query history API
+MAX_RESULTS_PER_PAGE = 1000
 
-    with open(properties_file, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
+# orjson is optional; it parses large query history responses much faster than json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_loads(data):
+    """Parse JSON from str or bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
 
-            if '=' in line:
-                key, value = line.split('=', 1)
-                props[key.strip()] = value.strip()
 
-    return props
+def parse_properties_text(text):
+    """Parse KEY=VALUE lines (Java properties style), skipping blanks and # comments."""
+    return {
+        match.group(1): match.group(2).strip()
+        for match in PROPERTY_LINE_PATTERN.finditer(text)
+    }
+
+
+def parse_connection_properties(properties_file):
+    """Parse DBR connection properties file."""
+    with open(properties_file, 'r') as f:
+        return parse_properties_text(f.read())
 
 
 def extract_warehouse_id(connection_string):
     """Extract warehouse ID from DBR JDBC connection string."""
     # Example: jdbc:dbr://dbc-33354dfe-277f.cloud.dbr.com:443;httpPath=/sql/1.0/warehouses/e020ff73ae69ed5a
-    match = re.search(r'/warehouses/([a-f0-9]+)', connection_string)
+    match = WAREHOUSE_ID_PATTERN.search(connection_string)
     if match:
         return match.group(1)
     return None
@@ -78,7 +101,7 @@ def extract_warehouse_id(connection_string):
 def extract_host(connection_string):
     """Extract host from JDBC connection string."""
     # jdbc:dbr://HOST:443/...
-    match = re.search(r'jdbc:dbr://([^:]+)', connection_string)
+    match = JDBC_HOST_PATTERN.search(connection_string)
     if match:
         return f"https://{match.group(1)}"
     return None
@@ -95,16 +118,16 @@ def parse_metadata_file(metadata_file):
         content = f.read()
 
         # Extract bash variables
-        for match in re.finditer(r'^(\w+)=(.+)$', content, re.MULTILINE):
+        for match in METADATA_VAR_PATTERN.finditer(content):
             key, value = match.groups()
             if key not in ['CLUSTER_CONFIG']:
                 metadata[key] = value.strip().strip('"\'')
 
         # Extract CLUSTER_CONFIG JSON
-        cluster_config_match = re.search(r'CLUSTER_CONFIG=\'({[^}]+})\'', content, re.DOTALL)
+        cluster_config_match = CLUSTER_CONFIG_PATTERN.search(content)
         if cluster_config_match:
             try:
-                cluster_config = json.loads(cluster_config_match.group(1))
+                cluster_config = json_loads(cluster_config_match.group(1))
                 metadata['CLUSTER_CONFIG'] = cluster_config
             except json.JSONDecodeError:
                 pass
@@ -114,22 +137,11 @@ def parse_metadata_file(metadata_file):
 
 def parse_test_properties(test_properties_file):
     """Parse test properties file."""
-    props = {}
-
     if not os.path.exists(test_properties_file):
-        return props
+        return {}
 
     with open(test_properties_file, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-
-            if '=' in line:
-                key, value = line.split('=', 1)
-                props[key.strip()] = value.strip()
-
-    return props
+        return parse_properties_text(f.read())
 
 
 def parse_test_result_json(test_result_file):
@@ -140,8 +152,8 @@ def parse_test_result_json(test_result_file):
         return None, None
 
     try:
-        with open(test_result_file, 'r') as f:
-            data = json.load(f)
+        with open(test_result_file, 'rb') as f:
+            data = json_loads(f.read())
 
         # Extract start and end times from test_result.json
         # Format: "2025-01-31T14:30:22"
@@ -163,8 +175,8 @@ def parse_test_result_json(test_result_file):
         return None, None
 
 
-def get_query_history(host, token, warehouse_id, start_time=None, end_time=None, hours=None):
-    """Fetch query history from DBR API."""
+def iter_query_history(host, token, warehouse_id, start_time=None, end_time=None, hours=None):
+    """Fetch query history from DBR API, yielding queries page by page."""
 
     url = f"{host}/api/2.0/sql/history/queries"
     headers = {
@@ -186,7 +198,7 @@ def get_query_history(host, token, warehouse_id, start_time=None, end_time=None,
 
     # Build query parameters
     params = {
-        "max_results": 1000,
+        "max_results": MAX_RESULTS_PER_PAGE,
         "filter_by.query_start_time_range.start_time_ms": int(start_time.timestamp() * 1000),
         "filter_by.query_start_time_range.end_time_ms": int(end_time.timestamp() * 1000)
     }
@@ -196,14 +208,38 @@ def get_query_history(host, token, warehouse_id, start_time=None, end_time=None,
 
     print(f"Fetching query history from {start_time.strftime('%Y-%m-%d %H:%M:%S')} to {end_time.strftime('%Y-%m-%d %H:%M:%S')} (warehouse={warehouse_id})...")
 
-    response = requests.get(url, headers=headers, params=params)
-    response.raise_for_status()
+    while True:
+        response = requests.get(url, headers=headers, params=params)
+        response.raise_for_status()
+
+        page = json_loads(response.content)
+        yield from page.get('res', [])
+
+        next_page_token = page.get('next_page_token')
+        if not page.get('has_next_page') or not next_page_token:
+            break
 
-    return response.json()
+        # Follow-up pages are requested with the page token instead of the filter
+        params = {
+            "max_results": MAX_RESULTS_PER_PAGE,
+            "page_token": next_page_token
+        }
+
+
+def format_epoch_ms(epoch_ms):
+    """Format epoch milliseconds as local 'YYYY-MM-DD HH:MM:SS' ('' if missing)."""
+    if not epoch_ms:
+        return ''
+    t = time.localtime(epoch_ms // 1000)
+    return f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d} {t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}"
 
 
 def export_to_csv(queries, output_file, metadata=None, test_properties=None, include_metadata=True):
-    """Export queries to CSV with optional metadata."""
+    """Export queries (any iterable of query dicts) to CSV with optional metadata.
+
+    Returns the number of queries written.
+    """
+    query_count = 0
 
     with open(output_file, 'w', newline='') as f:
         writer = csv.writer(f)
@@ -215,57 +251,56 @@ def export_to_csv(queries, output_file, metadata=None, test_properties=None, inc
             'rows_produced', 'error_message'
         ]
 
-        # Add metadata columns if requested
+        # Metadata columns are the same for every query, so resolve them once
+        metadata_columns = []
+        metadata_values = []
         if include_metadata:
             if metadata:
                 if 'ENGINE' in metadata:
-                    header.append('engine')
+                    metadata_columns.append('engine')
+                    metadata_values.append(metadata.get('ENGINE', ''))
                 if 'CLUSTER_CONFIG' in metadata:
-                    header.extend(['cluster_size', 'estimated_cores', 'instance_type'])
+                    cluster_config = metadata.get('CLUSTER_CONFIG', {})
+                    metadata_columns.extend(['cluster_size', 'estimated_cores', 'instance_type'])
+                    metadata_values.extend([
+                        cluster_config.get('cluster_size', ''),
+                        cluster_config.get('estimated_cores', ''),
+                        cluster_config.get('instance_type', '')
+                    ])
 
             if test_properties:
                 if 'CONCURRENT_QUERY_COUNT' in test_properties:
-                    header.append('test_concurrency')
+                    metadata_columns.append('test_concurrency')
+                    metadata_values.append(test_properties.get('CONCURRENT_QUERY_COUNT', ''))
                 if 'HOLD_PERIOD' in test_properties:
-                    header.append('test_duration_min')
+                    metadata_columns.append('test_duration_min')
+                    metadata_values.append(test_properties.get('HOLD_PERIOD', ''))
 
+        header.extend(metadata_columns)
         writer.writerow(header)
 
         # Write query data
-        for query in queries.get('res', []):
-            row = [
+        def build_row(query):
+            nonlocal query_count
+            query_count += 1
+            return [
                 query.get('query_id', ''),
                 query.get('query_text', '').replace('\n', ' ').replace('\r', ' '),
                 query.get('status', ''),
                 query.get('duration', ''),
-                datetime.fromtimestamp(query.get('query_start_time_ms', 0) / 1000).strftime('%Y-%m-%d %H:%M:%S') if query.get('query_start_time_ms') else '',
-                datetime.fromtimestamp(query.get('query_end_time_ms', 0) / 1000).strftime('%Y-%m-%d %H:%M:%S') if query.get('query_end_time_ms') else '',
+                format_epoch_ms(query.get('query_start_time_ms')),
+                format_epoch_ms(query.get('query_end_time_ms')),
                 query.get('user_name', ''),
                 query.get('warehouse_id', ''),
                 query.get('rows_produced', ''),
-                query.get('error_message', '')
+                query.get('error_message', ''),
+                # Add metadata values if requested
+                *metadata_values
             ]
 
-            # Add metadata values if requested
-            if include_metadata:
-                if metadata:
-                    if 'ENGINE' in metadata:
-                        row.append(metadata.get('ENGINE', ''))
-                    if 'CLUSTER_CONFIG' in metadata:
-                        cluster_config = metadata.get('CLUSTER_CONFIG', {})
-                        row.extend([
-                            cluster_config.get('cluster_size', ''),
-                            cluster_config.get('estimated_cores', ''),
-                            cluster_config.get('instance_type', '')
-                        ])
+        writer.writerows(map(build_row, queries))
 
-                if test_properties:
-                    if 'CONCURRENT_QUERY_COUNT' in test_properties:
-                        row.append(test_properties.get('CONCURRENT_QUERY_COUNT', ''))
-                    if 'HOLD_PERIOD' in test_properties:
-                        row.append(test_properties.get('HOLD_PERIOD', ''))
-
-            writer.writerow(row)
+    return query_count
 
 
 def main():
@@ -363,17 +398,15 @@ def main():
         # Use hours
         hours = args.hours or 6
 
-    # Fetch query history
+    # Fetch the first page up front so an empty range doesn't create an output file
+    queries = iter_query_history(host, token, warehouse_id, start_time, end_time, hours)
     try:
-        queries = get_query_history(host, token, warehouse_id, start_time, end_time, hours)
+        first_query = next(queries, None)
     except requests.exceptions.RequestException as e:
         print(f"Error fetching query history: {e}")
         sys.exit(1)
 
-    query_count = len(queries.get('res', []))
-    print(f"Fetched {query_count} queries")
-
-    if query_count == 0:
+    if first_query is None:
         print("No queries found in the specified time range")
         return
 
@@ -386,9 +419,14 @@ def main():
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         output_file = f"reports/dbr_query_history_{timestamp}.csv"
 
-    # Export to CSV
+    # Export to CSV, fetching the remaining pages as rows are written
     print(f"Exporting to {output_file}...")
-    export_to_csv(queries, output_file, metadata, test_properties, not args.no_metadata)
+    try:
+        query_count = export_to_csv(chain([first_query], queries), output_file,
+                                    metadata, test_properties, not args.no_metadata)
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching query history: {e}")
+        sys.exit(1)
 
     print(f"✓ Successfully exported {query_count} queries to {output_file}")
 
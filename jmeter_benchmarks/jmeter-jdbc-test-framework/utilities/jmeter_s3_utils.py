@@ -9,13 +9,69 @@ This module provides reusable functions for:
 - Extracting run information
 """
 
+import os
 import re
 import json
-import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+from urllib.parse import urlparse
 from datetime import datetime
 
+# Optional: only needed for S3 access; local statistics files load without it
+try:
+    import boto3
+    from botocore.exceptions import BotoCoreError, ClientError
+    _S3_ERRORS = (BotoCoreError, ClientError)
+except ImportError:
+    boto3 = None
+    # _s3() raises ImportError with an install hint; report it like any other S3 error
+    _S3_ERRORS = (ImportError,)
+
+# Optional: orjson parses statistics payloads several times faster than json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional: SIMD-accelerated parsing for whole statistics files
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+# statistics.json key holding the aggregate row rather than a query
+_TOTAL_KEY = frozenset(['Total'])
+
+
+def json_loads(data):
+    """Parse JSON from str or bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# simdjson parsers reuse internal buffers and are not thread-safe: keep one per thread
+_simdjson_local = threading.local()
+
+
+def parse_statistics(data: bytes) -> Dict:
+    """Parse statistics.json bytes, using simdjson when available (ValueError if invalid)."""
+    if simdjson is None:
+        return json_loads(data)
+
+    parser = getattr(_simdjson_local, 'parser', None)
+    if parser is None:
+        parser = _simdjson_local.parser = simdjson.Parser()
+    try:
+        return parser.parse(data).as_dict()
+    except RuntimeError as e:
+        raise ValueError(f"Invalid JSON: {e}") from e
+
 
 class JMeterS3Path:
     """Parse and validate JMeter S3 result paths."""
@@ -34,135 +90,145 @@ class JMeterS3Path:
         r'(?P<run_type>(?:concurrency_\d+|sequential))/?'
     )
 
+    # Total cores per cluster size
+    _CLUSTER_MAP = {
+        'XS': 30,
+        'S-2x2': 60,
+        'M': 120,
+        'S-4x4': 120,
+        'L': 240,
+    }
+
+    __slots__ = ('raw_path', 'metadata', 'engine', 'cluster_size', 'benchmark',
+                 'run_type', 'concurrency', 'is_sequential', 'cores')
+
     def __init__(self, s3_path: str):
         """Initialize and parse S3 path."""
         self.raw_path = s3_path.rstrip('/')
-        self.metadata = self._parse_path()
-
-    def _parse_path(self) -> Dict[str, str]:
-        """Parse S3 path and extract metadata."""
-        # Try run_type= format first
-        match = self.PATH_PATTERN_WITH_RUN_TYPE.match(self.raw_path)
-        if not match:
-            # Try direct concurrency_X format
-            match = self.PATH_PATTERN_DIRECT.match(self.raw_path)
-
-        if not match:
-            raise ValueError(f"Invalid S3 path format: {self.raw_path}")
-
-        metadata = match.groupdict()
-
-        # Parse run_type to extract concurrency or sequential info
-        run_type = metadata['run_type']
-        if run_type.startswith('concurrency_'):
-            metadata['concurrency'] = int(run_type.split('_')[1])
-            metadata['is_sequential'] = False
-        elif run_type == 'sequential':
-            metadata['concurrency'] = 1
-            metadata['is_sequential'] = True
-        else:
-            metadata['concurrency'] = None
-            metadata['is_sequential'] = None
-
-        return metadata
-
-    @property
-    def engine(self) -> str:
-        """Get engine name (e6data, dbr, etc.)."""
-        return self.metadata['engine']
-
-    @property
-    def cluster_size(self) -> str:
-        """Get cluster size (XS, S-2x2, M, S-4x4, etc.)."""
-        return self.metadata['cluster_size']
-
-    @property
-    def benchmark(self) -> str:
-        """Get benchmark name (tpcds_29_1tb, etc.)."""
-        return self.metadata['benchmark']
-
-    @property
-    def run_type(self) -> str:
-        """Get run type (concurrency_2, sequential, etc.)."""
-        return self.metadata['run_type']
-
-    @property
-    def concurrency(self) -> Optional[int]:
-        """Get concurrency level (None if not applicable)."""
-        return self.metadata.get('concurrency')
-
-    @property
-    def is_sequential(self) -> Optional[bool]:
-        """Check if this is a sequential run."""
-        return self.metadata.get('is_sequential')
+        self.metadata = _parse_s3_path(self.raw_path)
+
+        # Resolve metadata once into plain attributes
+        self.engine = self.metadata['engine']                  # e6data, dbr, etc.
+        self.cluster_size = self.metadata['cluster_size']      # XS, S-2x2, M, S-4x4, etc.
+        self.benchmark = self.metadata['benchmark']            # tpcds_29_1tb, etc.
+        self.run_type = self.metadata['run_type']              # concurrency_2, sequential, etc.
+        self.concurrency = self.metadata['concurrency']        # None if not applicable
+        self.is_sequential = self.metadata['is_sequential']
+        self.cores = self._CLUSTER_MAP.get(self.cluster_size, 0)
 
     def get_cores(self) -> int:
-        """Calculate total cores based on cluster size."""
-        cluster_map = {
-            'XS': 30,
-            'S-2x2': 60,
-            'M': 120,
-            'S-4x4': 120,
-            'L': 240,
-        }
-        return cluster_map.get(self.cluster_size, 0)
+        """Get total cores based on cluster size."""
+        return self.cores
 
     def __str__(self) -> str:
         """String representation."""
         return f"{self.engine} {self.cluster_size} ({self.run_type})"
 
 
-def list_s3_files(s3_path: str, pattern: str = "") -> list:
-    """List files in S3 path matching optional pattern."""
-    s3_path = s3_path.rstrip('/') + '/'
-    cmd = ['aws', 's3', 'ls', s3_path, '--recursive']
+@lru_cache(maxsize=4096)
+def _parse_s3_path(raw_path: str) -> Mapping[str, object]:
+    """
+    Parse S3 path and extract metadata.
+
+    Cached per path, so the result is returned as a read-only mapping.
+    """
+    match = None
+    # Only the run_type= format can match paths containing 'run_type='
+    if 'run_type=' in raw_path:
+        match = JMeterS3Path.PATH_PATTERN_WITH_RUN_TYPE.match(raw_path)
+    if not match:
+        # Try direct concurrency_X format
+        match = JMeterS3Path.PATH_PATTERN_DIRECT.match(raw_path)
+
+    if not match:
+        raise ValueError(f"Invalid S3 path format: {raw_path}")
+
+    metadata = match.groupdict()
+
+    # Parse run_type to extract concurrency or sequential info
+    run_type = metadata['run_type']
+    if run_type.startswith('concurrency_'):
+        metadata['concurrency'] = int(run_type.split('_')[1])
+        metadata['is_sequential'] = False
+    elif run_type == 'sequential':
+        metadata['concurrency'] = 1
+        metadata['is_sequential'] = True
+    else:
+        metadata['concurrency'] = None
+        metadata['is_sequential'] = None
+
+    return MappingProxyType(metadata)
+
+
+@lru_cache(maxsize=1)
+def _s3():
+    """
+    Shared S3 client, created on first use.
+
+    Keeps one connection pool across calls (boto3 clients are thread-safe).
+    """
+    if boto3 is None:
+        raise ImportError("boto3 is required for S3 access: pip install boto3")
+    return boto3.client('s3')
+
+
+def _split_s3_path(s3_path: str) -> Tuple[str, str]:
+    """Split an S3 path (with or without s3:// prefix) into bucket and key."""
+    parsed = urlparse(s3_path if s3_path.startswith('s3://') else 's3://' + s3_path)
+    return parsed.netloc, parsed.path.lstrip('/')
+
+
+def _list_s3_objects(s3_path: str, pattern: str = "") -> List[Dict]:
+    """List object entries (Key, LastModified, Size, ...) in S3 path matching optional pattern."""
+    bucket, prefix = _split_s3_path(s3_path.rstrip('/') + '/')
 
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        files = []
-        for line in result.stdout.strip().split('\n'):
-            if line:
-                parts = line.split(None, 3)
-                if len(parts) == 4:
-                    filename = parts[3]
-                    if pattern in filename:
-                        files.append(filename)
-        return files
-    except subprocess.CalledProcessError as e:
-        print(f"Error listing S3 files: {e.stderr}")
+        objects = []
+        paginator = _s3().get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                if pattern in obj['Key']:
+                    objects.append(obj)
+        return objects
+    except _S3_ERRORS as e:
+        print(f"Error listing S3 files: {e}")
         return []
 
 
-def download_s3_file(s3_path: str, filename: str, local_dir: Path) -> Optional[Path]:
-    """Download a specific file from S3 path."""
-    s3_path = s3_path.rstrip('/') + '/'
+def list_s3_files(s3_path: str, pattern: str = "") -> list:
+    """List files in S3 path matching optional pattern."""
+    return [obj['Key'] for obj in _list_s3_objects(s3_path, pattern)]
 
-    # Handle both full S3 URIs and just the path component
-    if not s3_path.startswith('s3://'):
-        s3_path = 's3://' + s3_path
 
-    s3_file = f"{s3_path}{filename}"
+def download_s3_file(s3_path: str, filename: str, local_dir: Path) -> Optional[Path]:
+    """Download a specific file from S3 path."""
+    bucket, prefix = _split_s3_path(s3_path.rstrip('/') + '/')
+    key = f"{prefix}{filename}"
     local_file = local_dir / filename
 
-    cmd = ['aws', 's3', 'cp', s3_file, str(local_file)]
-
     try:
-        subprocess.run(cmd, capture_output=True, text=True, check=True)
+        # boto3 does not create the target directory (aws s3 cp did)
+        local_dir.mkdir(parents=True, exist_ok=True)
+        _s3().download_file(bucket, key, str(local_file))
         return local_file
-    except subprocess.CalledProcessError as e:
-        print(f"Warning: Could not download {s3_file}: {e.stderr}")
+    except (*_S3_ERRORS, OSError) as e:
+        print(f"Warning: Could not download s3://{bucket}/{key}: {e}")
         return None
 
 
+def _latest_key(objects: List[Dict]) -> str:
+    """Return the key of the most recently modified object."""
+    return max(objects, key=lambda obj: (obj['LastModified'], obj['Key']))['Key']
+
+
 def find_latest_file(s3_path: str, pattern: str) -> Optional[str]:
     """Find the latest file matching pattern in S3 path."""
-    files = list_s3_files(s3_path, pattern)
-    if not files:
+    objects = _list_s3_objects(s3_path, pattern)
+    if not objects:
         return None
 
-    # Sort by filename (assumes timestamp in filename)
-    files.sort(reverse=True)
-    return files[0]
+    # The listing already carries LastModified, so no extra HEAD calls are needed
+    return _latest_key(objects)
 
 
 def download_jmeter_statistics(s3_path: str, local_dir: Path) -> Optional[Path]:
@@ -177,17 +243,77 @@ def download_jmeter_statistics(s3_path: str, local_dir: Path) -> Optional[Path]:
     latest_stats = find_latest_file(s3_path, 'statistics')
 
     if latest_stats:
-        # Extract just the filename
-        filename = latest_stats.split('/')[-1]
-        return download_s3_file(s3_path, filename, local_dir)
+        # Download by its full key, which may sit in a subfolder (e.g. run_id=...)
+        bucket, _ = _split_s3_path(s3_path)
+        key_dir, filename = f"{bucket}/{latest_stats}".rsplit('/', 1)
+        return download_s3_file(key_dir, filename, local_dir)
 
     return None
 
 
+def download_many(s3_file_paths: List[str], local_dir: Path,
+                  max_workers: int = 16) -> Dict[str, Path]:
+    """
+    Download many S3 files concurrently.
+
+    Each file is placed in its own numbered subdirectory of local_dir, so
+    files sharing a name (e.g. statistics.json) do not overwrite each other.
+
+    Returns dict: s3_file_path -> local file path (failed downloads are omitted).
+    """
+    def _download(item):
+        index, s3_file_path = item
+        s3_dir, filename = s3_file_path.rsplit('/', 1)
+        target_dir = local_dir / str(index)
+        target_dir.mkdir(parents=True, exist_ok=True)
+        return s3_file_path, download_s3_file(s3_dir, filename, target_dir)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(_download, enumerate(s3_file_paths))
+        return {s3_file_path: local_file for s3_file_path, local_file in results if local_file}
+
+
+def download_statistics_bulk(s3_paths: List[str], local_dir: Path,
+                             max_workers: int = 16) -> Dict[str, Path]:
+    """
+    Download the latest statistics file for many run paths at once.
+
+    Lists the common parent prefix of the run paths once per bucket instead of
+    once per run path, then downloads the selected files concurrently with
+    download_many.
+
+    Returns dict: s3_path -> local file path (run paths without statistics are omitted).
+    """
+    if not s3_paths:
+        return {}
+
+    # Group run key prefixes by bucket (listed keys exclude the bucket)
+    runs_by_bucket: Dict[str, List[Tuple[str, str]]] = {}
+    for s3_path in s3_paths:
+        bucket, key_prefix = _split_s3_path(s3_path.rstrip('/') + '/')
+        runs_by_bucket.setdefault(bucket, []).append((s3_path, key_prefix))
+
+    # Pick the latest statistics file under each run path
+    selected = {}
+    for bucket, runs in runs_by_bucket.items():
+        base_prefix = os.path.commonprefix([key_prefix for _, key_prefix in runs])
+        base_prefix = base_prefix[:base_prefix.rfind('/') + 1]
+        all_objects = _list_s3_objects(f"s3://{bucket}/{base_prefix}", 'statistics')
+
+        for s3_path, key_prefix in runs:
+            matches = [obj for obj in all_objects if obj['Key'].startswith(key_prefix)]
+            if matches:
+                selected[s3_path] = f"s3://{bucket}/{_latest_key(matches)}"
+
+    downloaded = download_many(list(selected.values()), local_dir, max_workers)
+    return {s3_path: downloaded[s3_file] for s3_path, s3_file in selected.items()
+            if s3_file in downloaded}
+
+
 def load_jmeter_statistics(stats_file: Path) -> Dict:
     """Load and parse JMeter statistics.json file."""
-    with open(stats_file, 'r') as f:
-        return json.load(f)
+    with open(stats_file, 'rb') as f:
+        return parse_statistics(f.read())
 
 
 def load_statistics_from_s3(s3_file_path: str) -> Optional[Dict]:
@@ -201,23 +327,29 @@ def load_statistics_from_s3(s3_file_path: str) -> Optional[Dict]:
     Returns:
         Dictionary with statistics data, or None if error
     """
-    # Ensure s3:// prefix
-    if not s3_file_path.startswith('s3://'):
-        s3_file_path = 's3://' + s3_file_path
-
-    cmd = ['aws', 's3', 'cp', s3_file_path, '-']
+    bucket, key = _split_s3_path(s3_file_path)
 
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        return json.loads(result.stdout)
-    except subprocess.CalledProcessError as e:
-        print(f"Error loading {s3_file_path}: {e.stderr}")
+        body = _s3().get_object(Bucket=bucket, Key=key)['Body'].read()
+        return parse_statistics(body)
+    except _S3_ERRORS as e:
+        print(f"Error loading s3://{bucket}/{key}: {e}")
         return None
-    except json.JSONDecodeError as e:
-        print(f"Error parsing JSON from {s3_file_path}: {e}")
+    except ValueError as e:
+        print(f"Error parsing JSON from s3://{bucket}/{key}: {e}")
         return None
 
 
+def load_many_statistics(s3_file_paths: List[str], max_workers: int = 16) -> List[Optional[Dict]]:
+    """
+    Load several statistics files from S3 concurrently.
+
+    Returns one entry per path, in order (None where load_statistics_from_s3 failed).
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(load_statistics_from_s3, s3_file_paths))
+
+
 def extract_query_metrics(stats: Dict, query_name: str) -> Optional[Dict]:
     """
     Extract metrics for a specific query from statistics.json.
@@ -242,11 +374,14 @@ def extract_query_metrics(stats: Dict, query_name: str) -> Optional[Dict]:
     }
 
 
+def _query_keys(stats: Dict) -> set:
+    """Get query names from a statistics dict (every key except 'Total')."""
+    return stats.keys() - _TOTAL_KEY
+
+
 def get_all_query_names(stats1: Dict, stats2: Dict) -> set:
     """Get union of all query names from two statistics dicts."""
-    queries1 = {k for k in stats1.keys() if k != 'Total'}
-    queries2 = {k for k in stats2.keys() if k != 'Total'}
-    return queries1.union(queries2)
+    return (stats1.keys() | stats2.keys()) - _TOTAL_KEY
 
 
 def calculate_percentage_diff(val1: float, val2: float) -> float:
@@ -260,6 +395,15 @@ def calculate_percentage_diff(val1: float, val2: float) -> float:
     return ((val2 - val1) / val2) * 100.0
 
 
+def calculate_percentage_diffs(values1: List[float], values2: List[float]) -> List[float]:
+    """
+    Calculate percentage differences for paired values in one pass.
+
+    Same semantics as calculate_percentage_diff applied element-wise.
+    """
+    return [((v2 - v1) / v2) * 100.0 if v2 != 0 else 0.0 for v1, v2 in zip(values1, values2)]
+
+
 def format_percentage(pct: float, show_sign: bool = True) -> str:
     """Format percentage with appropriate sign and color indicators."""
     if show_sign:
@@ -268,11 +412,18 @@ def format_percentage(pct: float, show_sign: bool = True) -> str:
     return f"{pct:.1f}%"
 
 
+@lru_cache(maxsize=1)
+def _date_key(minute: int) -> str:
+    """Format the local date of a minute since the epoch (cached per minute)."""
+    return datetime.fromtimestamp(minute * 60).strftime('%Y%m%d')
+
+
 def get_timestamp() -> str:
     """Get current timestamp for report filenames."""
-    return datetime.now().strftime('%Y%m%d')
+    return _date_key(int(time.time()) // 60)
 
 
+@lru_cache(maxsize=8192)
 def normalize_query_name(query_name: str, source_engine: str) -> str:
     """
     Normalize query names between different engines.
@@ -286,11 +437,10 @@ def normalize_query_name(query_name: str, source_engine: str) -> str:
 
     # If in E6Data format (query-X-TPCDS-Y), extract TPCDS-Y
     if source_engine == 'e6data' and query_name.startswith('query-'):
-        parts = query_name.split('-')
-        # Find TPCDS part
-        for i, part in enumerate(parts):
-            if part == 'TPCDS' and i + 1 < len(parts):
-                return f"TPCDS-{parts[i+1]}"
+        # First '-TPCDS-<n>' segment
+        _, sep, after = query_name.partition('-TPCDS-')
+        if sep:
+            return f"TPCDS-{after.partition('-')[0]}"
 
     return query_name
 
@@ -301,27 +451,11 @@ def create_query_mapping(stats1: Dict, stats2: Dict, engine1: str, engine2: str)
 
     Returns dict: normalized_name -> (query_name_in_stats1, query_name_in_stats2)
     """
-    mapping = {}
-
-    # Get all queries from both stats
-    queries1 = {k for k in stats1.keys() if k != 'Total'}
-    queries2 = {k for k in stats2.keys() if k != 'Total'}
-
-    # Normalize and map
-    for q1 in queries1:
-        normalized = normalize_query_name(q1, engine1)
-        if normalized not in mapping:
-            mapping[normalized] = [None, None]
-        mapping[normalized][0] = q1
-
-    for q2 in queries2:
-        normalized = normalize_query_name(q2, engine2)
-        if normalized not in mapping:
-            mapping[normalized] = [None, None]
-        mapping[normalized][1] = q2
-
-    # Convert lists to tuples and filter out incomplete mappings
-    return {k: tuple(v) for k, v in mapping.items() if all(v)}
+    # Normalize each side once, then keep names present in both
+    names1 = {normalize_query_name(q1, engine1): q1 for q1 in _query_keys(stats1)}
+    names2 = {normalize_query_name(q2, engine2): q2 for q2 in _query_keys(stats2)}
+
+    return {k: (names1[k], names2[k]) for k in names1.keys() & names2.keys()}
 
 
 if __name__ == '__main__':
@@ -9,28 +9,78 @@ with JMeter or with the actual SQL queries.
 Usage:
     python test_queries_http.py <connection_properties> <query_csv>
 
+Queries run concurrently; set CONCURRENCY (default 8) to change the number of
+in-flight requests, e.g. CONCURRENCY=1 to run them one at a time.
+
 Example:
     python test_queries_http.py connection_properties/http_endpoint_connection_kantarWS.properties data_files/kantar_final_working.csv
 """
 
+import io
+import os
+import re
 import sys
 import csv
 import json
 import requests
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+
+# orjson is optional; it parses and serializes large query responses much faster than json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Properties line: optional indent, key (not starting with #), '=', value
+PROPERTY_LINE_PATTERN = re.compile(r'^[^\S\n]*([^#\s=][^=\n]*?|)[^\S\n]*=(.*)$', re.MULTILINE)
+
+# Number of completed queries whose progress lines are written to stdout together
+PROGRESS_FLUSH_EVERY = 50
+
+# Shared session: reuses TCP/TLS connections (keep-alive) across authenticate and every query.
+# main() mounts an adapter whose pool holds one connection per concurrent query.
+SESSION = requests.Session()
+
+# Static headers sent with every execute request, matching JMeter
+EXECUTE_HEADERS = {
+    'Content-Type': 'application/json',
+    'Accept': 'application/json, text/plain, */*',
+    'Origin': 'https://espresso-dev.kantar.com',
+    'Referer': 'https://espresso-dev.kantar.com/',
+    'Sec-Fetch-Mode': 'cors',
+    'Sec-Fetch-Site': 'cross-site',
+    'Accept-Language': 'en-US,en;q=0.9'
+}
+
+def json_loads(data):
+    """Parse JSON from str or bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def json_dumps(data):
+    """Serialize data to UTF-8 JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data).encode('utf-8')
+
+def write_json(filepath, data):
+    """Write data to filepath as indented JSON, using orjson when available."""
+    if orjson is not None:
+        with open(filepath, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(filepath, 'w') as f:
+            json.dump(data, f, indent=2)
 
 def load_properties(filepath):
     """Load properties from a Java-style properties file"""
-    props = {}
     with open(filepath, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if line and not line.startswith('#'):
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    props[key.strip()] = value.strip()
-    return props
+        text = f.read()
+    return {match.group(1): match.group(2).strip() for match in PROPERTY_LINE_PATTERN.finditer(text)}
 
 def authenticate(props):
     """Authenticate with e6data API and return session token"""
@@ -52,11 +102,11 @@ def authenticate(props):
     print(f"  Cluster: {props.get('cluster_name', 'N/A')}")
 
     try:
-        response = requests.post(auth_url, json=auth_payload, headers=headers, timeout=30)
+        response = SESSION.post(auth_url, json=auth_payload, headers=headers, timeout=30)
 
         if response.status_code == 200:
             # IMPORTANT: Token is in sessionId field, not token field!
-            response_data = response.json()
+            response_data = json_loads(response.content)
             session_id = response_data.get('sessionId')
 
             if session_id:
@@ -70,7 +120,7 @@ def authenticate(props):
         else:
             print(f"❌ Authentication failed: {response.status_code}")
             try:
-                print(f"Response: {json.dumps(response.json(), indent=2)}")
+                print(f"Response: {json.dumps(json_loads(response.content), indent=2)}")
             except:
                 print(f"Response: {response.text}")
             return None
@@ -79,34 +129,21 @@ def authenticate(props):
         print(f"❌ Authentication error: {e}")
         return None
 
-def execute_query(execute_url, token, query_alias, query_text, catalog, schema, cluster_name):
-    """Execute a single query and return result"""
+def execute_query(execute_url, query_alias, query_text, catalog, schema):
+    """Execute a single query and return result (auth/cluster headers are set on SESSION)"""
     # IMPORTANT: The query is sent directly WITHOUT pre-escaping
-    # json.dumps() will handle all necessary escaping when serializing the payload
-    payload = {
-        "statement": query_text,  # Raw query - json.dumps will escape it
+    # json_dumps() will handle all necessary escaping when serializing the payload
+    payload = json_dumps({
+        "statement": query_text,  # Raw query - json_dumps will escape it
         "catalog": catalog,
         "schema": schema
-    }
-
-    # Match JMeter headers exactly
-    headers = {
-        'Content-Type': 'application/json',
-        'Authorization': f"Bearer {token}",
-        'cluster-name': cluster_name,
-        'Accept': 'application/json, text/plain, */*',
-        'Origin': 'https://espresso-dev.kantar.com',
-        'Referer': 'https://espresso-dev.kantar.com/',
-        'Sec-Fetch-Mode': 'cors',
-        'Sec-Fetch-Site': 'cross-site',
-        'Accept-Language': 'en-US,en;q=0.9'
-    }
+    })
 
-    start_time = time.time()
+    start_ns = time.perf_counter_ns()
 
     try:
-        response = requests.post(execute_url, headers=headers, json=payload, timeout=60)
-        elapsed_ms = int((time.time() - start_time) * 1000)
+        response = SESSION.post(execute_url, data=payload, timeout=60)
+        elapsed_ms = (time.perf_counter_ns() - start_ns) // 1_000_000
 
         result = {
             'alias': query_alias,
@@ -117,17 +154,17 @@ def execute_query(execute_url, token, query_alias, query_text, catalog, schema,
         }
 
         if response.status_code == 200:
-            result['response'] = response.json()
+            result['response'] = json_loads(response.content)
         else:
             try:
-                result['error'] = response.json()
+                result['error'] = json_loads(response.content)
             except:
                 result['error'] = response.text
 
         return result
 
     except requests.exceptions.Timeout:
-        elapsed_ms = int((time.time() - start_time) * 1000)
+        elapsed_ms = (time.perf_counter_ns() - start_ns) // 1_000_000
         return {
             'alias': query_alias,
             'status_code': 0,
@@ -137,7 +174,7 @@ def execute_query(execute_url, token, query_alias, query_text, catalog, schema,
             'error': 'Request timeout (60s)'
         }
     except Exception as e:
-        elapsed_ms = int((time.time() - start_time) * 1000)
+        elapsed_ms = (time.perf_counter_ns() - start_ns) // 1_000_000
         return {
             'alias': query_alias,
             'status_code': 0,
@@ -157,6 +194,15 @@ def main():
     connection_file = sys.argv[1]
     query_file = sys.argv[2]
 
+    # Number of in-flight queries (CONCURRENCY=1 runs them one at a time)
+    concurrency = max(1, int(os.getenv('CONCURRENCY', 8)))
+
+    # Keep a pooled connection per worker so none are discarded under load.
+    # No retries: a silently retried request would add its retry time to elapsed_ms.
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency, max_retries=0)
+    SESSION.mount('https://', adapter)
+    SESSION.mount('http://', adapter)
+
     print("="*80)
     print("e6data HTTP API Query Tester (Python - Bypassing JMeter)")
     print("="*80)
@@ -190,52 +236,62 @@ def main():
     print(f"Cluster: {cluster_name}")
     print()
 
-    # Load queries
-    queries = []
+    # Every execute request carries the same headers (matching JMeter exactly); set them once
+    SESSION.headers.update({
+        **EXECUTE_HEADERS,
+        'Authorization': f"Bearer {token}",
+        'cluster-name': cluster_name
+    })
+
+    # Load queries as (alias, query) pairs
     try:
         with open(query_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                queries.append({
-                    'alias': row['QUERY_ALIAS'],
-                    'query': row['QUERY']
-                })
+            queries = [(row['QUERY_ALIAS'], row['QUERY']) for row in csv.DictReader(f)]
         print(f"Loaded {len(queries)} queries from CSV\n")
     except Exception as e:
         print(f"❌ Error loading queries: {e}")
         sys.exit(1)
 
-    # Execute each query
-    results = []
+    # Execute queries concurrently
+    results = [None] * len(queries)
 
     print("="*80)
-    print("EXECUTING QUERIES")
+    print(f"EXECUTING QUERIES (concurrency: {concurrency})")
     print("="*80)
     print()
 
-    for i, query_obj in enumerate(queries, 1):
-        alias = query_obj['alias']
-        query = query_obj['query']
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(execute_query, execute_url, alias, query, catalog, schema): index
+            for index, (alias, query) in enumerate(queries)
+        }
 
-        print(f"[{i}/{len(queries)}] Testing {alias}...")
-        print(f"  Query length: {len(query)} chars")
+        # Per-query progress is buffered and written to stdout in batches
+        progress = io.StringIO()
+        for i, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            # Keep results in CSV order for the summary
+            results[futures[future]] = result
 
-        result = execute_query(execute_url, token, alias, query, catalog, schema, cluster_name)
-        results.append(result)
+            print(f"[{i}/{len(queries)}] Tested {result['alias']}...", file=progress)
+            print(f"  Query length: {result['query_length']} chars", file=progress)
 
-        if result['success']:
-            print(f"  ✅ SUCCESS - {result['elapsed_ms']}ms")
-        else:
-            print(f"  ❌ FAILED - Status {result['status_code']} - {result['elapsed_ms']}ms")
-            if isinstance(result.get('error'), dict):
-                error_msg = result['error'].get('message', str(result['error']))
-                print(f"  Error: {error_msg[:200]}")
+            if result['success']:
+                print(f"  ✅ SUCCESS - {result['elapsed_ms']}ms", file=progress)
             else:
-                print(f"  Error: {str(result.get('error', 'Unknown'))[:200]}")
-        print()
-
-        # Small delay between requests to avoid overwhelming API
-        time.sleep(0.5)
+                print(f"  ❌ FAILED - Status {result['status_code']} - {result['elapsed_ms']}ms", file=progress)
+                if isinstance(result.get('error'), dict):
+                    error_msg = result['error'].get('message', str(result['error']))
+                    print(f"  Error: {error_msg[:200]}", file=progress)
+                else:
+                    print(f"  Error: {str(result.get('error', 'Unknown'))[:200]}", file=progress)
+            print(file=progress)
+
+            if i % PROGRESS_FLUSH_EVERY == 0 or i == len(queries):
+                sys.stdout.write(progress.getvalue())
+                sys.stdout.flush()
+                progress.seek(0)
+                progress.truncate()
 
     # Summary
     print("="*80)
@@ -284,17 +340,16 @@ def main():
     # Save detailed results to JSON
     output_file = f"test_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
     try:
-        with open(output_file, 'w') as f:
-            json.dump({
-                'timestamp': datetime.now().isoformat(),
-                'connection': connection_file,
-                'query_file': query_file,
-                'total': len(results),
-                'successful': success_count,
-                'failed': failure_count,
-                'success_rate': success_rate,
-                'results': results
-            }, f, indent=2)
+        write_json(output_file, {
+            'timestamp': datetime.now().isoformat(),
+            'connection': connection_file,
+            'query_file': query_file,
+            'total': len(results),
+            'successful': success_count,
+            'failed': failure_count,
+            'success_rate': success_rate,
+            'results': results
+        })
         print(f"\n📄 Detailed results saved to: {output_file}")
     except Exception as e:
         print(f"\n⚠️  Could not save results file: {e}")
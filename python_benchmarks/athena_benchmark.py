@@ -1,16 +1,29 @@
 import csv
+import re
 import threading
 import time
+from functools import partial
 from multiprocessing import Pool
 from pathlib import Path
 
 from pyathena import connect
 
-from utils import get_logger, create_readable_name_from_key_name, read_from_csv, ram_cpu_usage
+from utils import BatchPools, get_logger, create_readable_name_from_key_name, read_from_csv, ram_cpu_usage
 from utils.envs import *
 
 ENGINE = 'Athena'
 
+_COLUMN_ORDER = ('db_name', 'query_alias_name', 'query_text', 'query_id', 'query_status', 'execution_time',
+                 'client_perceived_time', 'row_count', 'bytes_scanned_in_GB', 'err_msg', 'start_time',
+                 'end_time')
+_HEADER = tuple(create_readable_name_from_key_name(i) for i in _COLUMN_ORDER)
+
+# Reports are written next to this script
+_REPORT_DIR = Path(__file__).resolve().parent
+
+# Any whitespace run (newlines, tabs, repeated spaces) in a query collapses to one space
+_WS_RE = re.compile(r'\s+')
+
 logger = get_logger()
 
 
@@ -41,7 +54,7 @@ def athena_query_method(row):
     ONLY FOR CONCURRENCY QUERIES
     """
     query_alias_name = row.get('query_alias_name')
-    query = row.get('query').replace('\n', ' ').replace('  ', ' ')
+    query = _WS_RE.sub(' ', row.get('query')).strip()
     db_name = row.get('db_name') or DB_NAME
     local_connection = create_athena_con()
     logger.info(
@@ -204,74 +217,65 @@ class AthenaBenchmark:
 
             pool_pool = list()
             size = min(self.total_number_of_threads, len(all_rows))
-            loop_count = (len(all_rows) / self.total_number_of_threads)
-            concurrent_looper = int(loop_count) + 1 if int(loop_count) != loop_count else int(loop_count)
-            for j in range(concurrent_looper):
-                pool = Pool(processes=size)
-                res = pool.map_async(athena_query_method, (i for i in all_rows[size * j:size * (j + 1)]))
-                pool_pool.append(res)
-                time.sleep(self.time_wait)
-            logger.info("Running concurrent queries in ATHENA with ENABLE_CONCURRENCY enabled")
-            for j in pool_pool:
-                for output in j.get():
-                    status, query_alias_name, query, db_name = output[0], output[1], output[2], output[3]
-
-                    if status.get('query_status') == 'Failure':
-                        self.failed_query_count += 1
-                        self.failed_query_alias.append(query_alias_name)
-                    else:
-                        self.success_query_count += 1
-                    self.query_results.append(dict(
-                        s_no=self.counter + 1,
-                        query_alias_name=query_alias_name,
-                        query_text=query,
-                        db_name=db_name,
-                        **status
-                    ))
-                    logger.info(dict(
-                        s_no=self.counter + 1,
-                        query_alias_name=query_alias_name,
-                        query_text=query,
-                        db_name=db_name,
-                        **status
-                    ))
-                    logger.info('{}. Query status of query alias: {} {}'.format(
-                        self.counter,
-                        query_alias_name,
-                        status.get('query_status'))
-                    )
-                    self.counter += 1
+            # Integer ceiling division: number of batches of `total_number_of_threads` queries
+            concurrent_looper = -(-len(all_rows) // self.total_number_of_threads)
+            # Pools are reused across batches instead of forked per batch; a batch fired while the
+            # earlier ones are still running gets another pool, so it still starts on time.
+            pools = BatchPools(partial(Pool, processes=max(size, 1)))
+            try:
+                for j in range(concurrent_looper):
+                    res = pools.next_pool().map_async(athena_query_method, (i for i in all_rows[size * j:size * (j + 1)]))
+                    pools.track(res)
+                    pool_pool.append(res)
+                    time.sleep(self.time_wait)
+                logger.info("Running concurrent queries in ATHENA with ENABLE_CONCURRENCY enabled")
+                for j in pool_pool:
+                    for status, query_alias_name, query, db_name in j.get():
+                        if status.get('query_status') == 'Failure':
+                            self.failed_query_count += 1
+                            self.failed_query_alias.append(query_alias_name)
+                        else:
+                            self.success_query_count += 1
+                        self.query_results.append(dict(
+                            s_no=self.counter + 1,
+                            query_alias_name=query_alias_name,
+                            query_text=query,
+                            db_name=db_name,
+                            **status
+                        ))
+                        logger.info(dict(
+                            s_no=self.counter + 1,
+                            query_alias_name=query_alias_name,
+                            query_text=query,
+                            db_name=db_name,
+                            **status
+                        ))
+                        logger.info('{}. Query status of query alias: {} {}'.format(
+                            self.counter,
+                            query_alias_name,
+                            status.get('query_status'))
+                        )
+                        self.counter += 1
+            finally:
+                pools.close()
         else:
             for row in all_rows:
                 logger.info("Running sequential queries in ATHENA with ENABLE_CONCURRENCY disabled")
                 status, query_alias_name, query, db_name = athena_query_method(row)
-                err_msg = status.pop('err_msg')
-                self.query_results.append(dict(
-                    **status,
-                    query_alias_name=query_alias_name,
-                    query_text=query,
-                    db_name=db_name,
-                    err_msg=err_msg
-                ))
                 if status.get('query_status') == 'Failure':
                     self.failed_query_count += 1
                     self.failed_query_alias.append(query_alias_name)
                 else:
                     self.success_query_count += 1
-                self.query_results.append(dict(
-                    s_no=self.counter + 1,
-                    query_alias_name=query_alias_name,
-                    query_text=query,
-                    db_name=db_name,
-                    **status
-                ))
-                logger.info(dict(
+                # The status dict is fresh per query, so it becomes the report row in place
+                status.update(
                     s_no=self.counter + 1,
                     query_alias_name=query_alias_name,
                     query_text=query,
                     db_name=db_name,
-                    **status
-                ))
+                )
+                self.query_results.append(status)
+                logger.info(status)
                 logger.info('{}. Query status of query alias: {} {}'.format(
                     self.counter,
                     query_alias_name,
@@ -294,23 +298,13 @@ class AthenaBenchmark:
         DB name, Query Alias, Query Text, Query ID, Query Status, Execution Time, Client Perceived Time,bytes_scanned_in_GB
         Row Count , Error message, Start Time, End Time, (edited)
         """
-        column_order = ['db_name', 'query_alias_name', 'query_text', 'query_id', 'query_status', 'execution_time',
-                        'client_perceived_time', 'row_count', 'bytes_scanned_in_GB', 'err_msg', 'start_time',
-                        'end_time']
-        path = Path(__file__).resolve().parent
         today = datetime.datetime.now().strftime('%Y-%m-%d_%H_%M_%S')
-        file_name = f'athena_results_{today}.csv'
-        result_file_path = os.path.join(path, file_name)
+        result_file_path = _REPORT_DIR / f'athena_results_{today}.csv'
         logger.info('Result local file path {}'.format(result_file_path))
         with open(result_file_path, 'w', newline='') as fp:
-            header_list = [create_readable_name_from_key_name(i) for i in column_order]
             writer = csv.writer(fp, delimiter=',')
-            writer.writerow(header_list)
-            for line in result:
-                ordered_data = list()
-                for k in column_order:
-                    ordered_data.append(line.get(k))
-                writer.writerow(ordered_data)
+            writer.writerow(_HEADER)
+            writer.writerows([line.get(k) for k in _COLUMN_ORDER] for line in result)
 
 
 if __name__ == '__main__':
@@ -1,17 +1,31 @@
 import csv
 import json
+import re
 import threading
 import time
+from functools import partial
 from multiprocessing import Pool
 from pathlib import Path
 
 from e6data_python_connector import Connection
 
-from utils import get_logger, create_readable_name_from_key_name, read_from_csv, ram_cpu_usage
+from utils import BatchPools, get_logger, create_readable_name_from_key_name, read_from_csv, ram_cpu_usage
 from utils.envs import *
 
 ENGINE = 'e6data'
 
+_COLUMN_ORDER = ('query_alias_name', 'query_text', 'query_id', 'query_status', 'parsing_time',
+                 'queuing_time', 'execution_time',
+                 # 'client_perceived_time',
+                 'row_count', 'err_msg', 'start_time', 'end_time')
+_HEADER = tuple(create_readable_name_from_key_name(i) for i in _COLUMN_ORDER)
+
+# Reports are written next to this script
+_REPORT_DIR = Path(__file__).resolve().parent
+
+# Any whitespace run (newlines, tabs, repeated spaces) in a query collapses to one space
+_WS_RE = re.compile(r'\s+')
+
 logger = get_logger()
 
 
@@ -24,7 +38,7 @@ def e6x_query_method(row):
     """
     client_perceived_start_time = time.time()
     query_alias_name = row.get('query_alias_name')
-    query = row.get('query').replace('\n', ' ').replace('  ', ' ')
+    query = _WS_RE.sub(' ', row.get('query')).strip()
     db_name = row.get('db_name') or DB_NAME
     logger.info(
         'Query alias: {}, FIRED at: {} BEFORE CREATING CONNECTION'.format(query_alias_name, datetime.datetime.now()))
@@ -201,24 +215,13 @@ class E6XBenchmark:
         DB name, Query Alias, Query Text, Query ID, Query Status, Execution Time, Client Perceived Time,
         Row Count , Error message, Start Time, End Time, (edited)
         """
-        column_order = ['query_alias_name', 'query_text', 'query_id', 'query_status',"parsing_time",
-                        "queuing_time", 'execution_time',
-                        # 'client_perceived_time',
-                        'row_count', 'err_msg', 'start_time', 'end_time']
-        path = Path(__file__).resolve().parent
         today = datetime.datetime.now().strftime('%Y-%m-%d_%H_%M_%S')
-        file_name = f'e6data_results_{today}.csv'
-        result_file_path = os.path.join(path, file_name)
+        result_file_path = _REPORT_DIR / f'e6data_results_{today}.csv'
         logger.info('Result local file path {}'.format(result_file_path))
         with open(result_file_path, 'w', newline='') as fp:
-            header_list = [create_readable_name_from_key_name(i) for i in column_order]
             writer = csv.writer(fp, delimiter=',')
-            writer.writerow(header_list)
-            for line in result:
-                ordered_data = list()
-                for k in column_order:
-                    ordered_data.append(line.get(k))
-                writer.writerow(ordered_data)
+            writer.writerow(_HEADER)
+            writer.writerows([line.get(k) for k in _COLUMN_ORDER] for line in result)
 
     def _check_envs(self):
         if not ENGINE_IP:
@@ -282,82 +285,72 @@ class E6XBenchmark:
 
             pool_pool = list()
             size = min(self.total_number_of_threads, len(all_rows))
-            loop_count = (len(all_rows) / self.total_number_of_threads)
-            concur_looper = int(loop_count) + 1 if int(loop_count) != loop_count else int(loop_count)
-            for j in range(concur_looper):
-                pool = Pool(processes=size)
-                res = pool.map_async(e6x_query_method, (i for i in all_rows[size * j:size * (j + 1)]))
-                pool_pool.append(res)
-                time.sleep(self.time_wait)
-            logger.info("Running concurrent queries in E6DATA with ENABLE_CONCURRENCY enabled")
-            for j in pool_pool:
-                for output in j.get():
-                    print(output)
-                    status, query_alias_name, query, db_name, client_perceived_time = output[0], output[1], output[2], \
-                        output[3], output[4]
-
-                    if status.get('query_status') == 'Failure':
-                        self.failed_query_count += 1
-                        self.failed_query_alias.append(query_alias_name)
-                    else:
-                        self.success_query_count += 1
-                    self.query_results.append(dict(
-                        s_no=self.counter + 1,
-                        query_alias_name=query_alias_name,
-                        query_text=query,
-                        db_name=db_name,
-                        client_perceived_time=client_perceived_time,
-                        **status
-                    ))
-                    logger.info(dict(
-                        s_no=self.counter + 1,
-                        query_alias_name=query_alias_name,
-                        query_text=query,
-                        db_name=db_name,
-                        client_perceived_time=client_perceived_time,
-                        **status
-                    ))
-                    logger.info('{}. Query status of query alias: {} {}'.format(
-                        self.counter,
-                        query_alias_name,
-                        status.get('query_status'))
-                    )
-                    self.counter += 1
-                    logger.info('JOINING...')
+            # Integer ceiling division: number of batches of `total_number_of_threads` queries
+            concur_looper = -(-len(all_rows) // self.total_number_of_threads)
+            # Pools are reused across batches instead of forked per batch; a batch fired while the
+            # earlier ones are still running gets another pool, so it still starts on time.
+            pools = BatchPools(partial(Pool, processes=max(size, 1)))
+            try:
+                for j in range(concur_looper):
+                    res = pools.next_pool().map_async(e6x_query_method, (i for i in all_rows[size * j:size * (j + 1)]))
+                    pools.track(res)
+                    pool_pool.append(res)
+                    time.sleep(self.time_wait)
+                logger.info("Running concurrent queries in E6DATA with ENABLE_CONCURRENCY enabled")
+                for j in pool_pool:
+                    for output in j.get():
+                        print(output)
+                        status, query_alias_name, query, db_name, client_perceived_time = output
+
+                        if status.get('query_status') == 'Failure':
+                            self.failed_query_count += 1
+                            self.failed_query_alias.append(query_alias_name)
+                        else:
+                            self.success_query_count += 1
+                        self.query_results.append(dict(
+                            s_no=self.counter + 1,
+                            query_alias_name=query_alias_name,
+                            query_text=query,
+                            db_name=db_name,
+                            client_perceived_time=client_perceived_time,
+                            **status
+                        ))
+                        logger.info(dict(
+                            s_no=self.counter + 1,
+                            query_alias_name=query_alias_name,
+                            query_text=query,
+                            db_name=db_name,
+                            client_perceived_time=client_perceived_time,
+                            **status
+                        ))
+                        logger.info('{}. Query status of query alias: {} {}'.format(
+                            self.counter,
+                            query_alias_name,
+                            status.get('query_status'))
+                        )
+                        self.counter += 1
+                        logger.info('JOINING...')
+            finally:
+                pools.close()
         else:
             for row in all_rows:
                 logger.info("Running sequential queries in E6DATA with ENABLE_CONCURRENCY disabled")
                 status, query_alias_name, query, db_name, client_perceived_time = e6x_query_method(row)
-                err_msg = status.pop('err_msg')
-                self.query_results.append(dict(
-                    **status,
-                    query_alias_name=query_alias_name,
-                    query_text=query,
-                    db_name=db_name,
-                    client_perceived_time=client_perceived_time,
-                    err_msg=err_msg
-                ))
                 if status.get('query_status') == 'Failure':
                     self.failed_query_count += 1
                     self.failed_query_alias.append(query_alias_name)
                 else:
                     self.success_query_count += 1
-                self.query_results.append(dict(
+                # The status dict is fresh per query, so it becomes the report row in place
+                status.update(
                     s_no=self.counter + 1,
                     query_alias_name=query_alias_name,
                     query_text=query,
                     db_name=db_name,
                     client_perceived_time=client_perceived_time,
-                    **status
-                ))
-                logger.info(dict(
-                    s_no=self.counter + 1,
-                    query_alias_name=query_alias_name,
-                    query_text=query,
-                    db_name=db_name,
-                    client_perceived_time=client_perceived_time,
-                    **status
-                ))
+                )
+                self.query_results.append(status)
+                logger.info(status)
                 logger.info('{}. Query status of query alias: {} {}'.format(
                     self.counter,
                     query_alias_name,
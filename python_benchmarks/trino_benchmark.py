@@ -1,13 +1,22 @@
+import atexit
+import io
+import logging
+import queue
+import re
 import threading
-from multiprocessing import Pool
+from logging.handlers import QueueHandler, QueueListener
+from multiprocessing.pool import ThreadPool
 
 import trino
 import csv
 
 import time
+from functools import partial
+from operator import itemgetter
 from pathlib import Path
 
-from utils import get_logger, create_readable_name_from_key_name, read_from_csv, ram_cpu_usage
+from utils import (BatchPools, get_logger, create_readable_name_from_key_name, read_from_csv, iter_from_csv,
+                   ram_cpu_usage)
 from utils.envs import *
 
 ENGINE = 'Trino'
@@ -15,38 +24,100 @@ ENGINE = 'Trino'
 max_retry_count = 10
 sleep_time = 10
 
+# Rows pulled per fetchmany call when counting query results
+FETCH_BATCH_SIZE = 10000
+
+_COLUMN_ORDER = ('db_name', 'query_alias_name', 'query_text', 'query_id', 'query_status', 'execution_time',
+                 'client_perceived_time', 'row_count', 'err_msg', 'start_time', 'end_time')
+_HEADER = tuple(create_readable_name_from_key_name(i) for i in _COLUMN_ORDER)
+_ROW_GETTER = itemgetter(*_COLUMN_ORDER)
+
+# Reports are written next to this script
+_REPORT_DIR = Path(__file__).resolve().parent
+
+# Any whitespace run (newlines, tabs, repeated spaces) in a query collapses to one space
+_WS_RE = re.compile(r'\s+')
+
 logger = get_logger()
 
 
+def _start_log_listener():
+    """
+    Move the logger's handlers behind a queue so stderr I/O stays off the result-drain path.
+    The calling thread still merges each message with its arguments (QueueHandler.prepare);
+    a single listener thread applies the handler formatter and writes the record.
+    """
+    log_queue = queue.SimpleQueue()
+    # Records carry their own creation time, so messages don't need to format datetime.now()
+    formatter = logging.Formatter('[%(asctime)s.%(msecs)03d %(levelname)s/%(processName)s] %(message)s',
+                                  datefmt='%Y-%m-%d %H:%M:%S')
+    for handler in logger.handlers:
+        handler.setFormatter(formatter)
+    listener = QueueListener(log_queue, *logger.handlers, respect_handler_level=True)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(QueueHandler(log_queue))
+    listener.start()
+    atexit.register(listener.stop)
+
+
+# Per-thread Trino connection, reused by every query run on that thread (one per pool worker)
+_thread_local = threading.local()
+
+
 class QueryException(Exception):
     pass
 
 
+def _get_connection():
+    """
+    Return this thread's Trino connection, creating it on first use.
+    """
+    connection = getattr(_thread_local, 'connection', None)
+    if connection is None:
+        connection = _thread_local.connection = create_trino_con()
+        if connection is not None:
+            atexit.register(connection.close)
+    return connection
+
+
+def _init_worker():
+    """
+    Pool initializer: connect once per worker, before it picks up queries.
+    """
+    _get_connection()
+
+
+def _on_complete(completed, index, output):
+    """
+    Pool callback: hand a finished query's output (or exception) back with its submission index.
+    """
+    completed.put((index, output))
+
+
 def trino_query_method(row):
     """
     ONLY FOR CONCURRENCY QUERIES
     """
     client_perceived_start_time = time.time()
     query_alias_name = row.get('query_alias_name')
-    query = row.get('query').replace('\n', ' ').replace('  ', ' ')
+    query = _WS_RE.sub(' ', row.get('query')).strip()
     db_name = row.get('db_name') or DB_NAME
-    logger.info(
-        'Query alias: {}, FIRED at: {} BEFORE CREATING CONNECTION'.format(query_alias_name, datetime.datetime.now()))
-    local_connection = create_trino_con()
-    logger.info(
-        'TIMESTAMP : {} connected with db {} and Engine {}'.format(datetime.datetime.now(), db_name, ENGINE_IP))
+    logger.info('Query alias: %s, FIRED BEFORE GETTING CONNECTION', query_alias_name)
+    local_connection = _get_connection()
+    logger.info('Connected with db %s and Engine %s', db_name, ENGINE_IP)
     local_cursor = local_connection.cursor()
-    logger.info('TIMESTAMP : {} Executing Query: {}'.format(datetime.datetime.now(), query))
-    logger.info('Query alias: {}, Started at: {}'.format(query_alias_name, datetime.datetime.now()))
+    logger.info('Executing Query: %s', query)
+    logger.info('Query alias: %s, Started', query_alias_name)
     status = query_on_trino(query, local_cursor,
                             query_alias=query_alias_name)
     client_perceived_time = round(time.time() - client_perceived_start_time, 3)
-    logger.info('Query alias: {}, Ended at: {}'.format(query_alias_name, datetime.datetime.now()))
+    logger.info('Query alias: %s, Ended', query_alias_name)
     try:
+        # Cursors carry per-statement state; the connection stays open for the next query
         local_cursor.close()
-        local_connection.close()
     except Exception as e:
-        logger.error("CURSOR CLOSE FAILED : {}".format(str(e)))
+        logger.error('CURSOR CLOSE FAILED : %s', e)
     return status, query_alias_name, query, db_name, client_perceived_time
 
 
@@ -58,13 +129,16 @@ def query_on_trino(query, cursor, query_alias=None) -> dict:
             Trino doesn't support ; at the end.
             """
             query = query[:-1]
-        logger.info(
-            'JUST BEFORE EXECUTION Query alias: {}, Started at: {}'.format(query_alias, datetime.datetime.now()))
+        logger.info('JUST BEFORE EXECUTION Query alias: %s', query_alias)
         cursor.execute(query)
-        results = cursor.fetchall()
-        row_count = len(results)
-        logger.info(
-            'JUST AFTER FETCH MANY Query alias: {}, Ended at: {}'.format(query_alias, datetime.datetime.now()))
+        # Only the row count is reported, so count batches instead of materializing all rows
+        row_count = 0
+        while True:
+            batch = cursor.fetchmany(FETCH_BATCH_SIZE)
+            if not batch:
+                break
+            row_count += len(batch)
+        logger.info('JUST AFTER FETCH MANY Query alias: %s', query_alias)
         query_end_time = datetime.datetime.now()
         query_status = 'Success'
 
@@ -81,7 +155,7 @@ def query_on_trino(query, cursor, query_alias=None) -> dict:
             err_msg=None,
         )
     except Exception as e:
-        logger.info('TIMESTAMP {} Error on querying {} engine: {}'.format(datetime.datetime.now(), ENGINE, e))
+        logger.info('Error on querying %s engine: %s', ENGINE, e)
         query_status = 'Failure'
         err_msg = str(e)
         query_end_time = datetime.datetime.now()
@@ -99,7 +173,7 @@ def query_on_trino(query, cursor, query_alias=None) -> dict:
 
 
 def create_trino_con(db_name=DB_NAME):
-    logger.info(f'TIMESTAMP : {datetime.datetime.now()} Connecting to Trino database...')
+    logger.info('Connecting to Trino database...')
     now = time.time()
     try:
         trino_connection = trino.dbapi.connect(
@@ -109,13 +183,11 @@ def create_trino_con(db_name=DB_NAME):
             catalog=TRINO_CATALOG,
             schema=db_name,
         )
-        logger.info('TIMESTAMP : {} Connected to Trino in {}'.format(datetime.datetime.now(), time.time() - now))
+        logger.info('Connected to Trino in %s', time.time() - now)
         return trino_connection
     except Exception as e:
         logger.error(e)
-        logger.error(
-            'TIMESTAMP : {} Failed to connect to the Trino database with {}'.format(datetime.datetime.now(), db_name)
-        )
+        logger.error('Failed to connect to the Trino database with %s', db_name)
 
 
 class TrinoBenchmark:
@@ -163,22 +235,16 @@ class TrinoBenchmark:
         DB name, Query Alias, Query Text, Query ID, Query Status, Execution Time, Client Perceived Time,
         Row Count , Error message, Start Time, End Time, (edited)
         """
-        column_order = ['db_name', 'query_alias_name', 'query_text', 'query_id', 'query_status', 'execution_time',
-                        'client_perceived_time', 'row_count', 'err_msg', 'start_time', 'end_time']
-        path = Path(__file__).resolve().parent
         today = datetime.datetime.now().strftime('%Y-%m-%d_%H_%M_%S')
-        file_name = f'trino_results_{today}.csv'
-        result_file_path = os.path.join(path, file_name)
-        logger.info('Result local file path {}'.format(result_file_path))
-        with open(result_file_path, 'w', newline='') as fp:
-            header_list = [create_readable_name_from_key_name(i) for i in column_order]
-            writer = csv.writer(fp, delimiter=',')
-            writer.writerow(header_list)
-            for line in result:
-                ordered_data = list()
-                for k in column_order:
-                    ordered_data.append(line.get(k))
-                writer.writerow(ordered_data)
+        result_file_path = _REPORT_DIR / f'trino_results_{today}.csv'
+        logger.info('Result local file path %s', result_file_path)
+        # Build the whole report in memory, then encode and write it in one go
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=',')
+        writer.writerow(_HEADER)
+        writer.writerows(map(_ROW_GETTER, result))
+        with open(result_file_path, 'wb') as fp:
+            fp.write(buffer.getvalue().encode('utf-8'))
 
     def _check_envs(self):
         if not ENGINE_IP:
@@ -212,14 +278,20 @@ class TrinoBenchmark:
             data += '{} - {} \n'.format(key, value)
         logger.info("SUMMARY\n" + data)
 
-    def _get_query_list_from_csv_file(self):
+    def _get_query_list_from_csv_file(self, stream=False):
+        """
+        With stream=True (and no shuffling) the rows are returned as a lazy iterator,
+        so the first query runs while the rest of the file is still unread.
+        """
         if not DB_NAME:
             raise QueryException(
                 'SET DB_NAME as environment variable.'
             )
         self.local_file_path = INPUT_CSV_PATH
-        logger.info('Local file path {}'.format(self.local_file_path))
+        logger.info('Local file path %s', self.local_file_path)
         logger.info('Reading data from file...')
+        if stream and not SHUFFLE_QUERY:
+            return iter_from_csv(self.local_file_path)
         data = read_from_csv(self.local_file_path)
         self.total_number_of_queries = len(data)
         return data
@@ -227,88 +299,96 @@ class TrinoBenchmark:
     def _perform_query_from_csv(self):
         logger.info('Performing query on Trino from cloud storage file (eg S3)')
 
-        all_rows = self._get_query_list_from_csv_file()
+        # Concurrent batches are sliced from the full list; sequential runs consume rows as they are read
+        all_rows = self._get_query_list_from_csv_file(stream=QUERYING_MODE != "CONCURRENT")
         if QUERYING_MODE == "CONCURRENT":
             self.total_number_of_threads = CONCURRENT_QUERY_COUNT
             self.time_wait = CONCURRENCY_INTERVAL
             self.total_number_of_threads = int(self.total_number_of_threads)
             self.time_wait = int(self.time_wait)
 
-            pool_pool = list()
             size = min(self.total_number_of_threads, len(all_rows))
-            loop_count = (len(all_rows) / self.total_number_of_threads)
-            concur_looper = int(loop_count) + 1 if int(loop_count) != loop_count else int(loop_count)
-            for j in range(concur_looper):
-                pool = Pool(processes=size)
-                res = pool.map_async(trino_query_method, (i for i in all_rows[size * j:size * (j + 1)]))
-                pool_pool.append(res)
-                time.sleep(self.time_wait)
-            logger.info("Running concurrent queries in Trino with ENABLE_CONCURRENCY enabled")
-            for j in pool_pool:
-                for output in j.get():
-                    status, query_alias_name, query, db_name, client_perceived_time = output[0], output[1], output[2], \
-                        output[3], output[4]
-
-                    if status.get('query_status') == 'Failure':
-                        self.failed_query_count += 1
-                        self.failed_query_alias.append(query_alias_name)
-                    else:
-                        self.success_query_count += 1
-                    self.query_results.append(dict(
-                        s_no=self.counter + 1,
-                        query_alias_name=query_alias_name,
-                        query_text=query,
-                        db_name=db_name,
-                        client_perceived_time=client_perceived_time,
-                        **status
-                    ))
-                    logger.info(dict(
-                        s_no=self.counter + 1,
+            # Thread pools are reused across batches: queries are network-bound, so threads avoid
+            # forking workers and pickling results. A batch fired while the earlier ones are still
+            # running gets another pool, so it still starts on time.
+            pools = BatchPools(partial(ThreadPool, processes=max(size, 1), initializer=_init_worker))
+            try:
+                # Submit row by row, pausing after every `size` queries; no pause after the last batch.
+                # Outputs come back through `completed` as each query finishes, not in submission order.
+                completed = queue.SimpleQueue()
+                for i, row in enumerate(all_rows):
+                    if i % size == 0:
+                        pool = pools.next_pool()
+                    on_complete = partial(_on_complete, completed, i)
+                    pools.track(pool.apply_async(trino_query_method, (row,),
+                                                 callback=on_complete, error_callback=on_complete))
+                    if (i + 1) % size == 0 and i + 1 < len(all_rows):
+                        time.sleep(self.time_wait)
+                logger.info("Running concurrent queries in Trino with ENABLE_CONCURRENCY enabled")
+                # Drain results as they complete, logging each one; the report keeps submission order
+                outputs = [None] * len(all_rows)
+                for counter in range(self.counter, self.counter + len(all_rows)):
+                    index, output = completed.get()
+                    if isinstance(output, BaseException):
+                        raise output
+                    outputs[index] = output
+                    status, query_alias_name, *_ = output
+                    logger.info('%s. Query status of query alias: %s %s (query id: %s, execution time: %s)',
+                                counter, query_alias_name, status['query_status'],
+                                status['query_id'], status['execution_time'])
+                # Then count and build the report rows in one pass each
+                failed_aliases = [query_alias_name for status, query_alias_name, *_ in outputs
+                                  if status['query_status'] == 'Failure']
+                self.failed_query_alias.extend(failed_aliases)
+                self.failed_query_count += len(failed_aliases)
+                self.success_query_count += len(outputs) - len(failed_aliases)
+                self.query_results.extend(
+                    dict(
+                        s_no=s_no,
                         query_alias_name=query_alias_name,
                         query_text=query,
                         db_name=db_name,
                         client_perceived_time=client_perceived_time,
                         **status
-                    ))
-                    logger.info('{}. Query status of query alias: {} {}'.format(
-                        self.counter,
-                        query_alias_name,
-                        status.get('query_status'))
                     )
-                    self.counter += 1
-                    logger.info('JOINING...')
+                    for s_no, (status, query_alias_name, query, db_name, client_perceived_time)
+                    in enumerate(outputs, self.counter + 1)
+                )
+                self.counter += len(outputs)
+            finally:
+                pools.close()
         else:
             for row in all_rows:
                 logger.info("Running sequential queries in Trino with ENABLE_CONCURRENCY disabled")
                 status, query_alias_name, query, db_name, client_perceived_time = trino_query_method(row)
-                err_msg = status.pop('err_msg')
-                if status.get('query_status') == 'Failure':
+                if status['query_status'] == 'Failure':
                     self.failed_query_count += 1
                     self.failed_query_alias.append(query_alias_name)
                 else:
                     self.success_query_count += 1
-                self.query_results.append(dict(
-                    **status,
+                # The status dict is fresh per query, so it becomes the report row in place
+                status.update(
                     query_alias_name=query_alias_name,
                     query_text=query,
                     db_name=db_name,
                     client_perceived_time=client_perceived_time,
-                    err_msg=err_msg
-                ))
+                )
+                self.query_results.append(status)
 
-        logger.info('TIMESTAMP {} ALL Query completed'.format(datetime.datetime.now()))
-        self.total_number_of_queries = len(all_rows)
+        logger.info('ALL Query completed')
+        self.total_number_of_queries = self.success_query_count + self.failed_query_count
         self.total_number_of_queries_successful = self.success_query_count
         self.total_number_of_queries_failed = self.failed_query_count
 
-        logger.info('Total failed query: {}'.format(self.failed_query_count))
-        logger.info('Total success query: {}'.format(self.success_query_count))
+        logger.info('Total failed query: %s', self.failed_query_count)
+        logger.info('Total success query: %s', self.success_query_count)
         is_any_query_failed = self.failed_query_count > 0
         return self.query_results, is_any_query_failed
 
 
 if __name__ == '__main__':
-    logger.info('Engin IP is {}'.format(os.getenv("ENGINE_IP")))
+    _start_log_listener()
+    logger.info('Engin IP is %s', os.getenv("ENGINE_IP"))
     a = threading.Thread(target=ram_cpu_usage, args=(5,))
     a.daemon = True
     a.start()
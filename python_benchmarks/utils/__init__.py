@@ -30,6 +30,56 @@ def create_readable_name_from_key_name(key: str) -> str:
     return " ".join([i.capitalize() for i in key.lower().split("_")])
 
 
+def _column_index(header: list, *names: str):
+    """
+    :param header: CSV header row.
+    :param names: candidate column names, in order of preference.
+    return: index of the first name present in the header, or None
+    """
+    for name in names:
+        if name in header:
+            return header.index(name)
+    return None
+
+
+def _field(row: list, index):
+    """
+    :param row: CSV row.
+    :param index: column index, or None if the column is absent.
+    return: the field value, or None if the column is absent or the row is too short
+    """
+    if index is None or index >= len(row):
+        return None
+    return row[index]
+
+
+def _iter_csv_queries(fh):
+    """
+    :param fh: open CSV file handle.
+    return: iterator of (query, query_alias_name) tuples
+    """
+    reader = csv.reader(fh)
+    header = next(reader, [])
+    query_index = _column_index(header, QUERY_CSV_COLUMN_NAME, 'query')
+    alias_index = _column_index(header, 'QUERY_ALIAS', 'query_alias_name')
+    for row in reader:
+        if row:
+            # Short rows yield None for missing fields, as DictReader did
+            yield (_field(row, query_index), _field(row, alias_index))
+
+
+def _query_row(query, query_alias_name):
+    return {
+        'query': query,
+        'query_alias_name': query_alias_name,
+        'db_name': DB_NAME,
+        'result_correctness_check': 0,
+        'query_num': None,
+        'group_id': None,
+        'query_category': None
+    }
+
+
 def read_from_csv(file_path: str):
     """
     :param file_path: CSV file absolute path.
@@ -37,22 +87,63 @@ def read_from_csv(file_path: str):
     return: List of dict
     """
     with open(file_path, 'r') as fh:
-        reader = csv.DictReader(fh)
-        csv_data = [i for i in reader]
+        csv_data = list(_iter_csv_queries(fh))
     if SHUFFLE_QUERY:
         random.shuffle(csv_data)
-    data = list()
-    for row in csv_data:
-        data.append({
-            'query': row.get(QUERY_CSV_COLUMN_NAME) or row.get('query'),
-            'query_alias_name': row.get('QUERY_ALIAS') or row.get('query_alias_name'),
-            'db_name': DB_NAME,
-            'result_correctness_check': 0,
-            'query_num': None,
-            'group_id': None,
-            'query_category': None
-        })
-    return data
+    return [_query_row(query, query_alias_name) for query, query_alias_name in csv_data]
+
+
+def iter_from_csv(file_path: str):
+    """
+    Streaming variant of read_from_csv: rows are parsed as they are consumed. Not shuffled.
+    :param file_path: CSV file absolute path.
+    return: iterator of dict
+    """
+    with open(file_path, 'r') as fh:
+        for query, query_alias_name in _iter_csv_queries(fh):
+            yield _query_row(query, query_alias_name)
+
+
+class BatchPools:
+    """
+    Worker pools for concurrency batches. Each batch runs on a pool whose previous batch has
+    finished; when every pool is still busy, a new one is created, so batches keep firing on
+    CONCURRENCY_INTERVAL (as with a fresh pool per batch) instead of queueing for free workers.
+    """
+
+    def __init__(self, factory):
+        """
+        :param factory: callable returning a new pool.
+        """
+        self._factory = factory
+        self._pools = []  # [pool, AsyncResults of its latest batch]
+        self._current = None
+
+    def next_pool(self):
+        """
+        return: the pool to run the next batch on
+        """
+        for entry in self._pools:
+            if all(result.ready() for result in entry[1]):
+                break
+        else:
+            entry = [self._factory(), []]
+            self._pools.append(entry)
+        entry[1] = []
+        self._current = entry
+        return entry[0]
+
+    def track(self, result):
+        """
+        :param result: AsyncResult of work submitted to the pool from the latest next_pool call.
+        """
+        self._current[1].append(result)
+
+    def close(self):
+        for pool, _ in self._pools:
+            pool.close()
+        for pool, _ in self._pools:
+            pool.join()
 
 
 def ram_cpu_usage(interval: int):
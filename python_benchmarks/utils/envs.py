@@ -1,5 +1,16 @@
 import datetime
 import os
+import time
+
+
+def _env_int(name: str, default: int) -> int:
+    """
+    :param name: environment variable name.
+    :param default: value used when the variable is unset or empty.
+    return: int value, resolved once when the module is imported
+    """
+    return int(os.environ.get(name) or default)
+
 
 SHUFFLE_QUERY=os.getenv("SHUFFLE_QUERY")=="true"
 
@@ -10,8 +21,8 @@ ENGINE_IP = os.getenv("ENGINE_IP")
 DB_NAME = os.getenv("DB_NAME")
 QUERY_CSV_COLUMN_NAME = os.getenv("QUERY_CSV_COLUMN_NAME") or 'QUERY'
 INPUT_CSV_PATH = os.getenv('INPUT_CSV_PATH')
-CONCURRENT_QUERY_COUNT = int(os.getenv("CONCURRENT_QUERY_COUNT") or 5)
-CONCURRENCY_INTERVAL = int(os.getenv("CONCURRENCY_INTERVAL") or 5)
+CONCURRENT_QUERY_COUNT = _env_int("CONCURRENT_QUERY_COUNT", 5)
+CONCURRENCY_INTERVAL = _env_int("CONCURRENCY_INTERVAL", 5)
 QUERYING_MODE = os.getenv('QUERYING_MODE') or "SEQUENTIAL"
 QUERY_INPUT_TYPE = 'CSV_PATH'  # mysql or csv
 E6_USER = os.getenv("E6_USER")
@@ -22,11 +33,11 @@ For Athena
 """
 RESULT_BUCKET = os.getenv("RESULT_BUCKET")
 GLUE_REGION = os.getenv("GLUE_REGION") or "us-east-1"
-RESULT_BUCKET_PATH = "s3://{}/Athena/{}".format(RESULT_BUCKET, datetime.datetime.now().strftime('%s'))
+RESULT_BUCKET_PATH = "s3://{}/Athena/{}".format(RESULT_BUCKET, int(time.time()))
 
 """
 For Trino
 """
-ENGINE_PORT = int(os.getenv("ENGINE_PORT") or 8889)
+ENGINE_PORT = _env_int("ENGINE_PORT", 8889)
 TRINO_USER = os.getenv("TRINO_USER") or "test"
 TRINO_CATALOG = os.getenv("TRINO_CATALOG") or "test"
\ No newline at end of file